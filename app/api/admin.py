@@ -0,0 +1,103 @@
+# File: app/api/admin.py
+
+import asyncio
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+
+from app.config import get_settings
+from app.logger import logger
+from app.services.kb_service import get_kb_service
+from app.services.conversation_manager import get_conversation_manager
+from app.services.openai_service import chat_breaker
+from app.services.response_cache import get_response_cache
+from app.services.order_lookup import get_order_lookup, order_flight
+from app.services.router_service import kb_flight, llm_flight
+from app.services.tracing import get_trace_recorder
+from app.services.usage_tracker import get_usage_tracker
+
+settings = get_settings()
+
+router = APIRouter()
+
+
+def require_admin(x_admin_token: str | None = Header(default=None)):
+    """
+    Admin endpoints need the X-Admin-Token header to match ADMIN_API_TOKEN.
+    Without a configured token they are closed unless ADMIN_ALLOW_UNAUTHENTICATED is set.
+    """
+    if settings.ADMIN_API_TOKEN:
+        if x_admin_token != settings.ADMIN_API_TOKEN:
+            raise HTTPException(status_code=401, detail="Invalid admin token")
+    elif not settings.ADMIN_ALLOW_UNAUTHENTICATED:
+        raise HTTPException(status_code=403, detail="ADMIN_API_TOKEN is not configured")
+
+
+@router.post("/admin/kb/reload", dependencies=[Depends(require_admin)])
+async def reload_kb(force: bool = False):
+    """
+    Re-read changed KB files and swap in a new index without downtime.
+    Requests keep being served from the previous snapshot until the swap.
+    """
+    result = await asyncio.to_thread(get_kb_service().reload, force)
+    logger.info(f"KB reload: {result}")
+    return result
+
+
+@router.get("/admin/cache/stats", dependencies=[Depends(require_admin)])
+async def cache_stats():
+    """Hit rates of the query-embedding, response and order caches, and request coalescing counts."""
+    return {
+        "query_embeddings": get_kb_service().query_cache.stats(),
+        "responses": get_response_cache().stats(),
+        "orders": get_order_lookup().cache.stats(),
+        "single_flight": {f.name: f.stats() for f in (kb_flight, llm_flight, order_flight)},
+    }
+
+
+@router.get("/admin/llm/breaker", dependencies=[Depends(require_admin)])
+async def llm_breaker():
+    """State, error rate and latency of the OpenAI circuit breaker."""
+    return chat_breaker.stats()
+
+
+@router.get("/admin/orders/lookups", dependencies=[Depends(require_admin)])
+async def order_lookup_stats():
+    """Outcome counts and latency of the Shopify and ClickBank order lookups, and the order cache."""
+    return get_order_lookup().stats()
+
+
+@router.get("/admin/traces", dependencies=[Depends(require_admin)])
+async def recent_traces(min_ms: float = 0.0, limit: int = 50):
+    """Most recent request traces, newest first; ``min_ms`` keeps only slow ones."""
+    return get_trace_recorder().recent(min_duration_ms=min_ms, limit=limit)
+
+
+@router.get("/admin/traces/{request_id}", dependencies=[Depends(require_admin)])
+async def trace_events(request_id: str):
+    """
+    Spans of one request as Chrome trace events; save the response as a
+    .json file and open it in chrome://tracing or ui.perfetto.dev.
+    """
+    trace = get_trace_recorder().get(request_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Trace not found (only recent requests are kept)")
+    return {"traceEvents": trace.trace_events(), "displayTimeUnit": "ms"}
+
+
+@router.get("/admin/usage", dependencies=[Depends(require_admin)])
+async def usage_summary():
+    """OpenAI tokens, cost and latency: totals, per call kind, model and intent."""
+    return get_usage_tracker().summary()
+
+
+@router.get("/admin/usage/conversations/{conversation_id}", dependencies=[Depends(require_admin)])
+async def conversation_usage(conversation_id: int):
+    """Usage totals of one conversation (no customer details)."""
+    conv = get_conversation_manager().conversations.get(conversation_id)
+    if conv is None:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    return {
+        "conversation_id": conversation_id,
+        "message_count": len(conv.messages),
+        "usage": conv.usage,
+    }
@@ -1,9 +1,14 @@
 # File: app/api/chatwoot_webhook.py
 
+import asyncio
+import json
+
 from fastapi import APIRouter, HTTPException
-from app.models.schemas import ChatwootIncomingMessage
-from app.services.router_service import handle_message
-from app.services.chatwoot_service import chatwoot_service
+from fastapi.responses import StreamingResponse
+from app.models.schemas import BotReply, ChatwootIncomingMessage
+from app.services.router_service import handle_message, stream_message
+from app.services.chatwoot_service import get_chatwoot_service
+from app.services.tracing import current_trace, span
 
 router = APIRouter()
 
@@ -19,13 +24,17 @@ async def chatwoot_webhook(payload: ChatwootIncomingMessage):
         # ignore internal notes
         return {"status": "ignored"}
 
-    bot_reply = handle_message(payload)
+    bot_reply = await handle_message(payload)
 
-    sent = chatwoot_service.send_message(
-        account_id=payload.conversation.account_id,
-        conversation_id=payload.conversation.id,
-        content=bot_reply.content,
-    )
+    # send_message is a blocking HTTP call; keep it off the event loop
+    with span("chatwoot.send") as attrs:
+        sent = await asyncio.to_thread(
+            get_chatwoot_service().send_message,
+            account_id=payload.conversation.account_id,
+            conversation_id=payload.conversation.id,
+            content=bot_reply.content,
+        )
+        attrs["sent"] = sent
 
     if not sent:
         raise HTTPException(status_code=500, detail="Failed to send message to Chatwoot")
@@ -45,10 +54,46 @@ async def test_message(payload: ChatwootIncomingMessage):
     Local testing endpoint without sending to Chatwoot.
     It just returns what the bot WOULD reply.
     """
-    bot_reply = handle_message(payload)
+    bot_reply = await handle_message(payload)
     return {
         "reply": bot_reply.content,
         "intent": bot_reply.detected_intent,
         "handoff": bot_reply.should_handoff,
-        "debug": bot_reply.debug_info,
+        "debug": _with_trace(bot_reply.debug_info),
     }
+
+
+def _with_trace(debug_info: dict) -> dict:
+    """debug_info plus the spans of this request so far."""
+    trace = current_trace()
+    return {**debug_info, "trace": trace.summary()} if trace is not None else debug_info
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+@router.post("/test/stream")
+async def test_message_stream(payload: ChatwootIncomingMessage):
+    """
+    Streaming version of /test as Server-Sent Events: a "delta" event per
+    piece of reply text as the model produces it, then one "done" event with
+    the intent, handoff decision and debug info.
+    """
+    async def events():
+        async for item in stream_message(payload):
+            if isinstance(item, BotReply):
+                yield _sse("done", {
+                    "intent": item.detected_intent,
+                    "handoff": item.should_handoff,
+                    "used_kb": item.used_kb,
+                    "debug": _with_trace(item.debug_info),
+                })
+            else:
+                yield _sse("delta", {"text": item})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,56 @@
+# File: app/api/shopify_webhook.py
+
+import base64
+import hashlib
+import hmac
+import json
+
+from fastapi import APIRouter, Header, HTTPException, Request
+
+from app.config import get_settings
+from app.logger import logger
+from app.services.order_lookup import get_order_lookup
+
+settings = get_settings()
+
+router = APIRouter()
+
+
+def verify_shopify_hmac(body: bytes, signature: str | None) -> bool:
+    """Shopify signs the raw body: base64(HMAC-SHA256(secret, body))."""
+    if not settings.SHOPIFY_WEBHOOK_SECRET:
+        return settings.SHOPIFY_WEBHOOK_ALLOW_UNSIGNED
+    if not signature:
+        return False
+    digest = hmac.new(settings.SHOPIFY_WEBHOOK_SECRET.encode("utf-8"), body, hashlib.sha256).digest()
+    return hmac.compare_digest(base64.b64encode(digest).decode("ascii"), signature)
+
+
+@router.post("/webhook/shopify/orders")
+async def shopify_order_webhook(
+    request: Request,
+    x_shopify_hmac_sha256: str | None = Header(default=None),
+    x_shopify_topic: str | None = Header(default=None),
+):
+    """
+    Receiver for Shopify order webhooks (orders/create, orders/updated,
+    orders/fulfilled, orders/cancelled, ...). Drops the cached Shopify
+    lookups of the order's customer so the next question sees the change.
+    """
+    body = await request.body()
+    if not verify_shopify_hmac(body, x_shopify_hmac_sha256):
+        raise HTTPException(status_code=401, detail="Invalid Shopify webhook signature")
+
+    try:
+        order = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON body")
+
+    email = order.get("email") or (order.get("customer") or {}).get("email")
+    if not email:
+        return {"status": "ignored"}
+
+    removed = get_order_lookup().invalidate("shopify", email)
+    logger.info(f"Shopify {x_shopify_topic or 'order'} webhook for order {order.get('order_number')}: "
+                f"dropped {removed} cached lookup(s)")
+    return {"status": "ok", "invalidated": removed}
@@ -15,6 +15,30 @@ load_dotenv(ENV_PATH)
 class Settings(BaseSettings):
     # OpenAI
     OPENAI_API_KEY: str
+    OPENAI_CHAT_MODEL: str = "gpt-4o-mini"
+    OPENAI_CHAT_MAX_TOKENS: int = 600
+    # Cheaper, faster configuration for short questions with a strong KB match
+    OPENAI_SMALL_MODEL: str = "gpt-4.1-nano"
+    OPENAI_SMALL_MAX_TOKENS: int = 300
+    OPENAI_TIMEOUT: float = 30.0  # seconds per chat completion request
+    # Circuit breaker around chat completions; while open, replies come from the KB
+    OPENAI_DEADLINE: float = 15.0  # seconds before a call counts as failed
+    OPENAI_BREAKER_FAILURES: int = 5  # consecutive failures that open the circuit
+    OPENAI_BREAKER_ERROR_RATE: float = 0.5  # or this error rate over the last 20 calls
+    OPENAI_BREAKER_RECOVERY: float = 30.0  # seconds open before a half-open probe
+    # Intent classification: nearest intent centroid of the query embedding
+    INTENT_MIN_SIMILARITY: float = 0.3
+    INTENT_KEYWORD_MARGIN: float = 0.05  # keyword intent kept if this close to the best centroid
+    # Answer routing: KB answer verbatim, small model, or full model
+    ROUTING_ENABLED: bool = True
+    ROUTING_DIRECT_MIN_SCORE: float = 0.85  # cosine score of the top KB match...
+    ROUTING_DIRECT_MIN_MARGIN: float = 0.05  # ...and its lead over the runner-up
+    ROUTING_SMALL_MIN_SCORE: float = 0.55
+    ROUTING_SMALL_MAX_CHARS: int = 160
+    # Prompt assembly: system prompt + KB blocks + recent history must fit the budget
+    PROMPT_TOKEN_BUDGET: int = 3000
+    PROMPT_HISTORY_MAX_TOKENS: int = 1000
+    PROMPT_HISTORY_MAX_MESSAGES: int = 10
 
     # Chatwoot
     CHATWOOT_BASE_URL: AnyHttpUrl
@@ -24,6 +48,10 @@ class Settings(BaseSettings):
     # Shopify
     SHOPIFY_STORE_DOMAIN: str
     SHOPIFY_ACCESS_TOKEN: str
+    # Signs order webhooks (/api/webhook/shopify/orders); if unset they are rejected
+    # unless SHOPIFY_WEBHOOK_ALLOW_UNSIGNED is set (local development only)
+    SHOPIFY_WEBHOOK_SECRET: str | None = None
+    SHOPIFY_WEBHOOK_ALLOW_UNSIGNED: bool = False
 
     # USPS (optional)
     USPS_USER_ID: str | None = None
@@ -32,6 +60,56 @@ class Settings(BaseSettings):
     CLICKBANK_DEV_KEY: str
     CLICKBANK_CLERK_KEY: str
 
+    # Order lookups: results per (provider, email, order/receipt) are cached
+    # briefly so follow-up questions about the same order make no API calls
+    ORDER_CACHE_SIZE: int = 2000
+    ORDER_CACHE_TTL: int = 300  # seconds
+    ORDER_CACHE_NEGATIVE_TTL: int = 60  # seconds, for "not found"
+
+    # Knowledge base
+    # Embedding backend: "openai" (API) or "local" (offline hashed n-grams)
+    EMBEDDING_BACKEND: str = "openai"
+    EMBEDDING_MODEL: str = "text-embedding-3-small"
+    LOCAL_EMBEDDING_DIM: int = 512
+    # Directory for the on-disk embedding cache (defaults to app/kb/cache)
+    KB_EMBEDDING_CACHE_DIR: str | None = None
+    # In-memory cache of query embeddings (repeated customer questions)
+    QUERY_EMBEDDING_CACHE_SIZE: int = 2048
+    QUERY_EMBEDDING_CACHE_TTL: int = 3600  # seconds
+    # Retries for a customer query's embedding before search falls back to BM25 only
+    QUERY_EMBEDDING_MAX_RETRIES: int = 2
+    QUERY_EMBEDDING_RETRY_BACKOFF: float = 0.25  # seconds, doubled per retry
+    # Long KB answers are indexed as overlapping passages
+    KB_CHUNK_MAX_CHARS: int = 600
+    KB_CHUNK_OVERLAP_CHARS: int = 120
+    # Approximate nearest-neighbour (IVF) index, used once the KB is large
+    KB_ANN_ENABLED: bool = True
+    KB_ANN_MIN_ITEMS: int = 20000
+    KB_ANN_NLIST: int = 0  # number of k-means cells; 0 = sqrt(items)
+    KB_ANN_NPROBE: int = 8  # cells scanned per query; higher = better recall, slower
+    # Bulk embedding of KB items at build/reload time
+    EMBEDDING_BATCH_SIZE: int = 256
+    EMBEDDING_BATCH_MAX_TOKENS: int = 100_000
+    EMBEDDING_CONCURRENCY: int = 4
+    EMBEDDING_MAX_RETRIES: int = 3
+    # How often to retry KB items whose embedding failed (e.g. OpenAI down at boot)
+    KB_EMBEDDING_RETRY_SECONDS: int = 60
+    # Semantic response cache: reuse a generated reply for a near-identical question
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_SIZE: int = 1000
+    RESPONSE_CACHE_THRESHOLD: float = 0.95  # cosine similarity of the query embeddings
+    RESPONSE_CACHE_TTL: int = 86400  # seconds
+
+    # Request tracing: recent traces are kept for /api/admin/traces, and
+    # requests slower than TRACE_SLOW_MS are logged with their slowest spans
+    TRACE_BUFFER_SIZE: int = 200
+    TRACE_SLOW_MS: int = 5000
+
+    # Admin endpoints (/api/admin/*) require this token; leaving it unset
+    # closes them unless ADMIN_ALLOW_UNAUTHENTICATED is set (local development only)
+    ADMIN_API_TOKEN: str | None = None
+    ADMIN_ALLOW_UNAUTHENTICATED: bool = False
+
     # General
     ENVIRONMENT: str = "development"
     LOG_LEVEL: str = "info"
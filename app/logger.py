@@ -2,14 +2,27 @@
 
 import logging
 from app.config import get_settings
+from app.services.tracing import current_request_id
 
 settings = get_settings()
 
 LOG_LEVEL = getattr(logging, settings.LOG_LEVEL.upper(), logging.INFO)
 
+_make_record = logging.getLogRecordFactory()
+
+
+def _record_with_request_id(*args, **kwargs) -> logging.LogRecord:
+    """Tag every log line with the ID of the request it was written for."""
+    record = _make_record(*args, **kwargs)
+    record.request_id = current_request_id() or "-"
+    return record
+
+
+logging.setLogRecordFactory(_record_with_request_id)
+
 logging.basicConfig(
     level=LOG_LEVEL,
-    format="%(asctime)s [%(levelname)s] %(name)s - %(message)s",
+    format="%(asctime)s [%(levelname)s] %(name)s [%(request_id)s] - %(message)s",
 )
 
 logger = logging.getLogger("hardchews-bot")
@@ -1,18 +1,74 @@
 # File: app/main.py
 
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
+from app.api.admin import router as admin_router
 from app.api.chatwoot_webhook import router as chatwoot_router
+from app.api.shopify_webhook import router as shopify_router
 from app.config import get_settings
 from app.logger import logger
+from app.services.chatwoot_service import get_chatwoot_service
+from app.services.hybrid_response_service import get_hybrid_service
+from app.services.kb_service import get_kb_service
+from app.services.openai_service import close_async_client
+from app.services.order_lookup import get_order_lookup
+from app.services.tracing import REQUEST_ID_HEADER, get_trace_recorder, start_trace
+from app.services.router_service import intent_classifier
 
 settings = get_settings()
 
+
+def _warm_up():
+    """Build the service singletons; loading and indexing the KB is the slow part."""
+    get_kb_service()
+    intent_classifier()
+    get_hybrid_service()
+    get_order_lookup()
+    get_chatwoot_service()
+
+
+async def _warm_up_in_background(app: FastAPI):
+    try:
+        await asyncio.to_thread(_warm_up)
+    except Exception as e:
+        logger.error(f"Startup warm-up failed: {e}")
+        return
+    app.state.ready = True
+    logger.info("Startup warm-up complete, ready for traffic")
+
+    # If the embeddings API was unreachable, keep retrying the missing KB
+    # vectors; until then search is keyword-only
+    kb = get_kb_service()
+    while kb.snapshot.missing_embeddings:
+        await asyncio.sleep(settings.KB_EMBEDDING_RETRY_SECONDS)
+        try:
+            result = await asyncio.to_thread(kb.reload)
+        except Exception as e:
+            logger.error(f"KB embedding retry failed: {e}")
+            continue
+        logger.info(f"KB embedding retry: {result['embedded']} embedded, {kb.snapshot.missing_embeddings} missing")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Start accepting connections right away; /ready reports when the KB is loaded.
+    app.state.ready = False
+    warm_up = asyncio.create_task(_warm_up_in_background(app))
+    yield
+    warm_up.cancel()
+    await close_async_client()
+
+
 app = FastAPI(
     title="HardChews AI Support Backend",
     description="AI-powered chatbot backend for HardChews customer support.",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # Enable CORS for frontend
@@ -22,19 +78,75 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[REQUEST_ID_HEADER],
 )
 
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """
+    Give every request an ID (the caller's X-Request-ID or a new one) and a
+    trace. The ID is echoed in the response, tagged on log lines and sent
+    on outbound calls. API request traces are kept for /api/admin/traces.
+
+    The trace ends when the last body chunk has been sent, so a streamed
+    reply (/api/test/stream) is timed through generation, not just until
+    its headers went out.
+    """
+    path = request.url.path
+    with start_trace(f"{request.method} {path}", request.headers.get(REQUEST_ID_HEADER), finish=False) as trace:
+        response = await call_next(request)
+    response.headers[REQUEST_ID_HEADER] = trace.request_id
+    keep = path.startswith("/api/") and not path.startswith("/api/admin/")
+    response.body_iterator = _finish_trace_after(response.body_iterator, trace, keep)
+    return response
+
+
+async def _finish_trace_after(body, trace, keep: bool):
+    try:
+        async for chunk in body:
+            yield chunk
+    finally:
+        trace.finish()
+        if keep:
+            _record_trace(trace)
+
+
+def _record_trace(trace):
+    get_trace_recorder().add(trace)
+    if trace.duration_ms >= settings.TRACE_SLOW_MS:
+        slowest = sorted(
+            (s for s in trace.spans if s["duration_ms"] is not None),
+            key=lambda s: s["duration_ms"],
+            reverse=True,
+        )[:3]
+        logger.warning(
+            f"Slow request {trace.name}: {trace.duration_ms:.0f} ms; slowest spans: "
+            + ", ".join(f"{s['name']} {s['duration_ms']:.0f} ms" for s in slowest)
+        )
+
 @app.get("/")
 async def root():
     return {
         "status": "running",
         "service": "HardChews AI Support Backend",
         "docs": "/docs",
-        "health": "/health"
+        "health": "/health",
+        "ready": "/ready"
     }
 
 @app.get("/health")
 async def health_check():
+    """Liveness: the process is up, whether or not warm-up has finished."""
     return {"status": "ok", "environment": settings.ENVIRONMENT}
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness: 503 until the KB and service clients are warmed up."""
+    if not getattr(app.state, "ready", False):
+        return JSONResponse(status_code=503, content={"status": "starting"})
+    return {"status": "ready"}
+
 app.include_router(chatwoot_router, prefix="/api")
+app.include_router(shopify_router, prefix="/api")
+app.include_router(admin_router, prefix="/api")
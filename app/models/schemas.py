@@ -48,3 +48,4 @@ class KBItem(BaseModel):
     tags: List[str] = []
     source: Optional[str] = None
     url: Optional[str] = None
+    parent_id: Optional[str] = None  # set on passages cut from a longer item
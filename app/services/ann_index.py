@@ -0,0 +1,110 @@
+# File: app/services/ann_index.py
+
+import os
+import uuid
+
+import numpy as np
+
+
+class IVFIndex:
+    """
+    Inverted-file (IVF) approximate nearest-neighbour index for unit vectors.
+
+    Spherical k-means splits the vectors into ``nlist`` cells. A query is
+    compared with the centroids and only the vectors in the ``nprobe``
+    closest cells are scored, so query cost grows with cell size instead of
+    KB size. Raising ``nprobe`` trades speed for recall; ``nprobe == nlist``
+    is an exact search.
+
+    The index stores ids only (CSR layout: ``offsets`` into ``ids``); the
+    vectors themselves stay in the caller's matrix.
+    """
+
+    def __init__(self, centroids: np.ndarray, offsets: np.ndarray, ids: np.ndarray, fingerprint: str = ""):
+        self.centroids = centroids
+        self.offsets = offsets
+        self.ids = ids
+        self.fingerprint = fingerprint
+
+    @property
+    def nlist(self) -> int:
+        return self.centroids.shape[0]
+
+    @classmethod
+    def build(
+        cls,
+        vectors: np.ndarray,
+        nlist: int = 0,
+        iterations: int = 10,
+        sample_size: int = 0,
+        seed: int = 0,
+        fingerprint: str = "",
+    ) -> "IVFIndex":
+        """
+        Train centroids with spherical k-means on (a sample of) ``vectors`` and
+        assign every vector to its closest centroid. ``nlist=0`` picks
+        ``sqrt(n)`` cells; ``sample_size=0`` trains on ``64 * nlist`` points.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        n = vectors.shape[0]
+        nlist = min(nlist or max(1, int(np.sqrt(n))), n)
+        rng = np.random.default_rng(seed)
+
+        sample_size = min(sample_size or 64 * nlist, n)
+        sample = vectors[rng.choice(n, size=sample_size, replace=False)] if sample_size < n else vectors
+        centroids = sample[rng.choice(sample.shape[0], size=nlist, replace=False)].copy()
+
+        for _ in range(iterations):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            counts = np.bincount(assign, minlength=nlist)
+            sums = np.zeros_like(centroids)
+            filled = np.flatnonzero(counts)
+            starts = (np.cumsum(counts) - counts)[filled]
+            sums[filled] = np.add.reduceat(sample[np.argsort(assign, kind="stable")], starts, axis=0)
+            empty = counts == 0
+            if empty.any():
+                # Re-seed empty cells with random training points.
+                sums[empty] = sample[rng.choice(sample.shape[0], size=int(empty.sum()))]
+            centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-10)
+
+        assign = np.empty(n, dtype=np.intp)
+        for start in range(0, n, 65536):
+            block = vectors[start:start + 65536]
+            assign[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+
+        ids = np.argsort(assign, kind="stable").astype(np.int64)
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(assign, minlength=nlist))
+        return cls(centroids.astype(np.float32), offsets, ids, fingerprint)
+
+    def candidates(self, q_vec: np.ndarray, nprobe: int) -> np.ndarray:
+        """Ids of every vector in the ``nprobe`` cells closest to ``q_vec``."""
+        nprobe = max(1, min(nprobe, self.nlist))
+        cell_scores = self.centroids @ q_vec
+        if nprobe < self.nlist:
+            cells = np.argpartition(-cell_scores, nprobe - 1)[:nprobe]
+        else:
+            cells = np.arange(self.nlist)
+        return np.concatenate([self.ids[self.offsets[c]:self.offsets[c + 1]] for c in cells])
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.{uuid.uuid4().hex[:8]}.tmp.npz"
+        np.savez(
+            tmp,
+            centroids=self.centroids,
+            offsets=self.offsets,
+            ids=self.ids,
+            fingerprint=np.array(self.fingerprint),
+        )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "IVFIndex":
+        with np.load(path) as data:
+            return cls(
+                data["centroids"],
+                data["offsets"],
+                data["ids"],
+                str(data["fingerprint"]),
+            )
@@ -0,0 +1,95 @@
+# File: app/services/bm25_index.py
+
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "can", "do", "does",
+    "for", "from", "how", "i", "if", "in", "is", "it", "its", "me", "my", "of",
+    "on", "or", "so", "that", "the", "this", "to", "was", "we", "what", "when",
+    "where", "which", "will", "with", "you", "your",
+}
+
+
+def _stem(token: str) -> str:
+    """Very small suffix stripper so 'refunds'/'refunded'/'refunding' share a term."""
+    for suffix in ("ing", "ed", "es", "s"):
+        if len(token) > len(suffix) + 3 and token.endswith(suffix) and not token.endswith("ss"):
+            return token[: -len(suffix)]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    return [_stem(t) for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    In-process Okapi BM25 inverted index.
+
+    Postings are stored per term as parallel NumPy arrays (doc ids, term
+    frequencies), so scoring a query touches only the documents that contain
+    one of its terms.
+    """
+
+    def __init__(self, documents: List[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.num_docs = len(documents)
+
+        doc_tokens = [tokenize(d) for d in documents]
+        self.doc_len = np.array([len(t) for t in doc_tokens], dtype=np.float32)
+        self.avgdl = float(self.doc_len.mean()) if self.num_docs else 0.0
+
+        ids: Dict[str, List[int]] = defaultdict(list)
+        tfs: Dict[str, List[int]] = defaultdict(list)
+        for doc_id, tokens in enumerate(doc_tokens):
+            for term, tf in Counter(tokens).items():
+                ids[term].append(doc_id)
+                tfs[term].append(tf)
+
+        self.postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self.idf: Dict[str, float] = {}
+        for term, doc_ids in ids.items():
+            df = len(doc_ids)
+            self.idf[term] = math.log(1.0 + (self.num_docs - df + 0.5) / (df + 0.5))
+            self.postings[term] = (
+                np.array(doc_ids, dtype=np.intp),
+                np.array(tfs[term], dtype=np.float32),
+            )
+
+        # Per-document length normalisation, precomputed once.
+        if self.num_docs:
+            self._norm = self.k1 * (1.0 - self.b + self.b * self.doc_len / max(self.avgdl, 1e-9))
+        else:
+            self._norm = self.doc_len
+
+    def scores(self, query: str, mask: np.ndarray | None = None) -> np.ndarray:
+        """
+        BM25 score of every document for ``query``, scaled to [0, 1] by the
+        best score a document could reach for these query terms. Documents
+        outside the boolean ``mask`` are dropped from the postings before
+        scoring and stay at zero.
+        """
+        out = np.zeros(self.num_docs, dtype=np.float32)
+        upper = 0.0
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            doc_ids, tf = posting
+            if mask is not None:
+                keep = mask[doc_ids]
+                doc_ids, tf = doc_ids[keep], tf[keep]
+            idf = self.idf[term]
+            out[doc_ids] += idf * tf * (self.k1 + 1.0) / (tf + self._norm[doc_ids])
+            upper += idf * (self.k1 + 1.0)
+        if upper > 0:
+            out /= upper
+        return out
@@ -1,10 +1,12 @@
 # File: app/services/chatwoot_service.py
 
+from functools import lru_cache
 from typing import Optional
 
 import requests
 
 from app.config import get_settings
+from app.services.tracing import outbound_headers
 
 settings = get_settings()
 
@@ -19,6 +21,7 @@ class ChatwootService:
         return {
             "Content-Type": "application/json",
             "api_access_token": self.api_token,
+            **outbound_headers(),
         }
 
     def send_message(
@@ -50,4 +53,6 @@ class ChatwootService:
             return False
 
 
-chatwoot_service = ChatwootService()
+@lru_cache
+def get_chatwoot_service() -> ChatwootService:
+    return ChatwootService()
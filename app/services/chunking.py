@@ -0,0 +1,71 @@
+# File: app/services/chunking.py
+
+import re
+from typing import List
+
+from app.models.schemas import KBItem
+
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s+|\n+")
+
+
+def _split_units(text: str, max_chars: int) -> List[str]:
+    """Sentences (or paragraph lines), with over-long ones cut on word boundaries."""
+    units: List[str] = []
+    for sentence in SENTENCE_RE.split(text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            units.append(sentence[:cut].strip())
+            sentence = sentence[cut:].strip()
+        if sentence:
+            units.append(sentence)
+    return units
+
+
+def split_passages(text: str, max_chars: int, overlap_chars: int) -> List[str]:
+    """
+    Pack sentences into passages of at most ``max_chars``; each passage starts
+    with up to ``overlap_chars`` of trailing sentences from the previous one.
+    """
+    if len(text) <= max_chars:
+        return [text]
+
+    units = _split_units(text, max_chars)
+    passages: List[str] = []
+    current: List[str] = []
+    size = 0
+    for unit in units:
+        if current and size + len(unit) + 1 > max_chars:
+            passages.append(" ".join(current))
+            # Carry the tail of this passage into the next one.
+            carry: List[str] = []
+            carried = 0
+            for prev in reversed(current):
+                if carried + len(prev) + 1 > overlap_chars or carried + len(prev) + len(unit) + 2 > max_chars:
+                    break
+                carry.insert(0, prev)
+                carried += len(prev) + 1
+            current, size = carry, carried
+        current.append(unit)
+        size += len(unit) + 1
+    if current:
+        passages.append(" ".join(current))
+    return passages
+
+
+def chunk_item(item: KBItem, max_chars: int, overlap_chars: int) -> List[KBItem]:
+    """
+    Split a long KB item into overlapping passages. Each passage is a KBItem
+    with the parent's title/question/tags, the passage as its answer and
+    ``parent_id`` pointing back to the parent. Short items are returned as-is.
+    """
+    passages = split_passages(item.answer, max_chars, overlap_chars)
+    if len(passages) == 1:
+        return [item]
+    return [
+        item.model_copy(update={"id": f"{item.id}#p{n}", "answer": passage, "parent_id": item.id})
+        for n, passage in enumerate(passages, start=1)
+    ]
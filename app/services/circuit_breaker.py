@@ -0,0 +1,125 @@
+# File: app/services/circuit_breaker.py
+
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, TypeVar
+
+import numpy as np
+
+T = TypeVar("T")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a dependency whose circuit is open."""
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker with a per-call deadline for an async dependency.
+
+    Every call runs under ``deadline`` seconds; a timeout counts as a
+    failure. The breaker opens after ``failure_threshold`` consecutive
+    failures, or when the error rate over the last ``window`` calls reaches
+    ``error_rate`` (once at least ``min_calls`` have been seen). While open,
+    calls fail fast with CircuitOpenError. After ``recovery_timeout`` seconds
+    a single probe call is let through (half-open): success closes the
+    circuit, failure opens it again.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        deadline: float = 20.0,
+        failure_threshold: int = 5,
+        error_rate: float = 0.5,
+        window: int = 20,
+        min_calls: int = 10,
+        recovery_timeout: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.deadline = deadline
+        self.failure_threshold = failure_threshold
+        self.error_rate = error_rate
+        self.min_calls = min_calls
+        self.recovery_timeout = recovery_timeout
+        self._clock = clock
+        self._outcomes: deque = deque(maxlen=window)  # (ok, latency seconds)
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.rejected = 0
+        self._probing = False
+
+    def allow(self) -> bool:
+        """Whether a call may go through now (moves open -> half-open when due)."""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and self._clock() - self.opened_at >= self.recovery_timeout:
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    async def call(self, fn: Callable[[], Awaitable[T]]) -> T:
+        if not self.allow():
+            self.rejected += 1
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        start = self._clock()
+        try:
+            result = await asyncio.wait_for(fn(), timeout=self.deadline)
+        except asyncio.CancelledError:
+            self._probing = False
+            raise
+        except Exception:
+            self.record_failure(self._clock() - start)
+            raise
+        self.record_success(self._clock() - start)
+        return result
+
+    def record_success(self, latency: float):
+        self._outcomes.append((True, latency))
+        self.consecutive_failures = 0
+        self._probing = False
+        self.state = CLOSED
+
+    def record_failure(self, latency: float):
+        self._outcomes.append((False, latency))
+        self.consecutive_failures += 1
+        self._probing = False
+        if self.state == HALF_OPEN or self._should_open():
+            self.state = OPEN
+            self.opened_at = self._clock()
+            self.times_opened += 1
+
+    def _should_open(self) -> bool:
+        if self.consecutive_failures >= self.failure_threshold:
+            return True
+        return len(self._outcomes) >= self.min_calls and self._error_rate() >= self.error_rate
+
+    def _error_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return sum(1 for ok, _ in self._outcomes if not ok) / len(self._outcomes)
+
+    def stats(self) -> Dict[str, Any]:
+        latencies = np.array([latency for _, latency in self._outcomes], dtype=np.float64)
+        return {
+            "name": self.name,
+            "state": self.state,
+            "deadline_seconds": self.deadline,
+            "recent_calls": len(self._outcomes),
+            "error_rate": round(self._error_rate(), 4),
+            "latency_p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 1) if latencies.size else None,
+            "latency_p99_ms": round(float(np.percentile(latencies, 99)) * 1000, 1) if latencies.size else None,
+            "consecutive_failures": self.consecutive_failures,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+        }
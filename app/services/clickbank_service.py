@@ -1,10 +1,12 @@
 # File: app/services/clickbank_service.py
 
+from functools import lru_cache
 from typing import Optional
 import requests
 
 from app.config import get_settings
 from app.logger import logger
+from app.services.tracing import outbound_headers
 
 settings = get_settings()
 
@@ -24,6 +26,7 @@ class ClickBankService:
         return {
             "Accept": "application/json",
             "Authorization": f"{self.dev_key}:{self.clerk_key}",
+            **outbound_headers(),
         }
 
     def find_order(self, email: str = "", receipt: str = "") -> Optional[dict]:
@@ -82,4 +85,6 @@ class ClickBankService:
         )
 
 
-clickbank_service = ClickBankService()
+@lru_cache
+def get_clickbank_service() -> ClickBankService:
+    return ClickBankService()
@@ -6,6 +6,8 @@ import os
 from datetime import datetime, timedelta
 from pydantic import BaseModel
 
+from app.services.usage_tracker import add_to_totals, empty_totals
+
 
 class ConversationMessage(BaseModel):
     """Single message in conversation history."""
@@ -24,6 +26,7 @@ class Conversation(BaseModel):
     created_at: str = None
     last_updated: str = None
     metadata: Dict = {}
+    usage: Dict = {}  # OpenAI tokens/cost/latency totals for this conversation
 
     def __init__(self, **data):
         super().__init__(**data)
@@ -164,6 +167,15 @@ class ConversationManager:
         messages.extend(conv.get_context_window(max_messages))
         return messages
 
+    def record_usage(self, conversation_id: int, entry: Dict):
+        """Add one OpenAI call (a UsageTracker entry) to the conversation's usage totals."""
+        conv = self.conversations.get(conversation_id)
+        if not conv:
+            return
+        if not conv.usage:
+            conv.usage = empty_totals()
+        add_to_totals(conv.usage, entry)
+
     def _save_conversation(self, conversation_id: int):
         """Save conversation to file."""
         if conversation_id not in self.conversations:
@@ -206,6 +218,7 @@ class ConversationManager:
             "conversation_id": conv.conversation_id,
             "customer_email": conv.customer_email,
             "message_count": len(conv.messages),
+            "usage": conv.usage,
             "created_at": conv.created_at,
             "last_updated": conv.last_updated,
             "duration_minutes": (
@@ -0,0 +1,124 @@
+# File: app/services/embedding_pipeline.py
+
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, List, Sequence, Tuple
+
+import numpy as np
+
+from app.logger import logger
+
+
+class BulkEmbedResult:
+    """
+    Output of :func:`bulk_embed`.
+
+    ``vectors`` has one row per input text (zero rows where the batch failed)
+    or is ``None`` if nothing could be embedded; ``failed`` lists the input
+    positions that have no vector.
+    """
+
+    def __init__(self, vectors: np.ndarray | None, failed: List[int]):
+        self.vectors = vectors
+        self.failed = failed
+
+    @property
+    def succeeded(self) -> List[int]:
+        if self.vectors is None:
+            return []
+        failed = set(self.failed)
+        return [i for i in range(self.vectors.shape[0]) if i not in failed]
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English text; good enough for batching.
+    return len(text) // 4 + 1
+
+
+def make_batches(
+    texts: Sequence[str], max_items: int, max_tokens: int
+) -> List[Tuple[int, int]]:
+    """Split ``texts`` into contiguous ``[start, end)`` ranges within both limits."""
+    batches: List[Tuple[int, int]] = []
+    start, tokens = 0, 0
+    for i, text in enumerate(texts):
+        cost = estimate_tokens(text)
+        if i > start and (i - start >= max_items or tokens + cost > max_tokens):
+            batches.append((start, i))
+            start, tokens = i, 0
+        tokens += cost
+    if start < len(texts):
+        batches.append((start, len(texts)))
+    return batches
+
+
+def embed_with_retry(
+    embed_fn: Callable[[List[str]], np.ndarray],
+    texts: List[str],
+    max_retries: int,
+    backoff: float,
+) -> np.ndarray:
+    """Call ``embed_fn(texts)``, retrying failures with jittered exponential backoff."""
+    attempt = 0
+    while True:
+        try:
+            return np.asarray(embed_fn(texts), dtype=np.float32)
+        except Exception as e:
+            if attempt >= max_retries:
+                raise
+            delay = backoff * (2 ** attempt) * (0.5 + random.random())
+            logger.warning(
+                f"Embedding of {len(texts)} texts failed ({e}); retry {attempt + 1}/{max_retries} in {delay:.1f}s"
+            )
+            time.sleep(delay)
+            attempt += 1
+
+
+def bulk_embed(
+    texts: Sequence[str],
+    embed_fn: Callable[[List[str]], np.ndarray],
+    max_batch_items: int = 256,
+    max_batch_tokens: int = 100_000,
+    concurrency: int = 4,
+    max_retries: int = 3,
+    backoff: float = 1.0,
+    progress: Callable[[int, int], None] | None = None,
+) -> BulkEmbedResult:
+    """
+    Embed ``texts`` in size-bounded batches with bounded concurrency.
+
+    Each batch is retried with exponential backoff; a batch that still fails
+    only marks its own texts as failed, the rest of the result stays usable.
+    """
+    if not texts:
+        return BulkEmbedResult(None, [])
+
+    batches = make_batches(texts, max_batch_items, max_batch_tokens)
+    vectors: np.ndarray | None = None
+    failed: List[int] = []
+    done = 0
+
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(batches)))) as pool:
+        futures = {
+            pool.submit(embed_with_retry, embed_fn, list(texts[s:e]), max_retries, backoff): (s, e)
+            for s, e in batches
+        }
+        for future in as_completed(futures):
+            start, end = futures[future]
+            try:
+                batch = future.result()
+            except Exception as e:
+                logger.error(f"Embedding batch [{start}:{end}] failed permanently: {e}")
+                failed.extend(range(start, end))
+            else:
+                if vectors is None:
+                    vectors = np.zeros((len(texts), batch.shape[1]), dtype=np.float32)
+                vectors[start:end] = batch
+            done += end - start
+            if progress:
+                progress(done, len(texts))
+
+    if vectors is None:
+        return BulkEmbedResult(None, list(range(len(texts))))
+    return BulkEmbedResult(vectors, sorted(failed))
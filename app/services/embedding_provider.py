@@ -0,0 +1,117 @@
+# File: app/services/embedding_provider.py
+
+import time
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import List
+
+import numpy as np
+from openai import OpenAI
+
+from app.config import get_settings
+from app.services.tracing import outbound_headers, record_span
+from app.services.usage_tracker import get_usage_tracker
+
+settings = get_settings()
+
+
+class EmbeddingProvider(ABC):
+    """
+    Turns a list of texts into a float32 matrix, one row per text.
+    ``model_name`` identifies the vector space (it keys the embedding cache).
+    """
+
+    model_name: str = ""
+
+    @abstractmethod
+    def embed(self, texts: List[str]) -> np.ndarray:
+        ...
+
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    """Embeddings from the OpenAI API."""
+
+    def __init__(self, api_key: str, model: str = "text-embedding-3-small"):
+        self.model_name = model
+        # Retries are handled by the callers (bulk_embed, KBService.embed_queries), not the client.
+        self._client = OpenAI(api_key=api_key, max_retries=0)
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        started = time.perf_counter()
+        try:
+            resp = self._client.embeddings.create(
+                model=self.model_name, input=texts, extra_headers=outbound_headers()
+            )
+        except Exception:
+            get_usage_tracker().record("embedding", self.model_name, latency=time.perf_counter() - started, ok=False)
+            record_span("openai.embeddings", started, ok=False, model=self.model_name, texts=len(texts))
+            raise
+        record_span("openai.embeddings", started, model=self.model_name, texts=len(texts))
+        get_usage_tracker().record(
+            "embedding",
+            self.model_name,
+            prompt_tokens=resp.usage.prompt_tokens if resp.usage else 0,
+            latency=time.perf_counter() - started,
+        )
+        return np.array([d.embedding for d in resp.data], dtype=np.float32)
+
+
+class LocalHashingEmbeddingProvider(EmbeddingProvider):
+    """
+    Deterministic, offline embeddings from hashed character n-grams.
+
+    Each text is lower-cased and every character n-gram is hashed (a
+    vectorized polynomial hash over the UTF-8 bytes) into one of ``dim``
+    buckets with a hash-derived sign. Counts are log-scaled and the row is
+    L2-normalized. No vocabulary, no network, same output on every machine.
+    """
+
+    _PRIME = np.uint64(1099511628211)
+    _MIX = np.uint64(0x9E3779B97F4A7C15)
+
+    def __init__(self, dim: int = 512, min_n: int = 3, max_n: int = 5):
+        self.dim = dim
+        self.min_n = min_n
+        self.max_n = max_n
+        self.model_name = f"local-hash-ngram-{min_n}-{max_n}-{dim}"
+
+    def _hashes(self, text: str) -> np.ndarray:
+        padded = f" {' '.join(text.lower().split())} "
+        codes = np.frombuffer(padded.encode("utf-8"), dtype=np.uint8).astype(np.uint64)
+        parts = []
+        for n in range(self.min_n, self.max_n + 1):
+            count = len(codes) - n + 1
+            if count <= 0:
+                continue
+            h = np.full(count, n, dtype=np.uint64)
+            for j in range(n):
+                h = h * self._PRIME + codes[j:j + count]
+            h ^= h >> np.uint64(29)
+            h *= self._MIX
+            h ^= h >> np.uint64(32)
+            parts.append(h)
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.uint64)
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            h = self._hashes(text)
+            if not h.size:
+                continue
+            buckets = (h % np.uint64(self.dim)).astype(np.intp)
+            signs = np.where(h >> np.uint64(63), -1.0, 1.0).astype(np.float32)
+            np.add.at(out[row], buckets, signs)
+        out = np.sign(out) * np.log1p(np.abs(out))
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        return out / np.maximum(norms, 1e-10)
+
+
+@lru_cache
+def get_embedding_provider() -> EmbeddingProvider:
+    """Embedding backend selected by ``EMBEDDING_BACKEND`` ("openai" or "local")."""
+    backend = settings.EMBEDDING_BACKEND.lower()
+    if backend == "local":
+        return LocalHashingEmbeddingProvider(dim=settings.LOCAL_EMBEDDING_DIM)
+    if backend == "openai":
+        return OpenAIEmbeddingProvider(settings.OPENAI_API_KEY, settings.EMBEDDING_MODEL)
+    raise ValueError(f"Unknown EMBEDDING_BACKEND: {settings.EMBEDDING_BACKEND!r}")
@@ -0,0 +1,138 @@
+# File: app/services/embedding_store.py
+
+import hashlib
+import json
+import os
+import re
+import threading
+import uuid
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+
+class EmbeddingStore:
+    """
+    Persistent embedding cache keyed by a hash of (model, text).
+
+    Vectors for one model live in a single float32 ``.npy`` matrix that is
+    opened memory-mapped. A small JSON index lists the row keys and names the
+    matrix file it belongs to, so a reader always sees a consistent pair even
+    if several workers write at once (last writer wins, nobody reads a torn
+    file).
+    """
+
+    def __init__(self, cache_dir: str, model: str):
+        self.cache_dir = cache_dir
+        self.model = model
+        self._slug = re.sub(r"[^A-Za-z0-9_.-]", "_", model)
+        self.index_path = os.path.join(cache_dir, f"{self._slug}.index.json")
+        self._lock = threading.Lock()
+        self._rows: Dict[str, int] = {}
+        self._keys: List[str] = []
+        self._matrix: np.ndarray | None = None
+        self._matrix_file: str | None = None
+        self._load()
+
+    @staticmethod
+    def key_for(model: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\n{text}".encode("utf-8")).hexdigest()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _load(self):
+        """Open the index and memory-map its matrix; a broken cache is treated as empty."""
+        if not os.path.exists(self.index_path):
+            return
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("model") != self.model:
+                return
+            matrix = np.load(os.path.join(self.cache_dir, meta["matrix"]), mmap_mode="r")
+            keys = meta["keys"]
+            if matrix.ndim != 2 or matrix.shape[0] < len(keys):
+                return
+        except Exception as e:
+            print(f"⚠️ Warning: Ignoring unreadable embedding cache {self.index_path}: {e}")
+            return
+
+        self._matrix = matrix
+        self._matrix_file = meta["matrix"]
+        self._keys = list(keys)
+        self._rows = {k: i for i, k in enumerate(self._keys)}
+
+    def fetch(self, texts: Sequence[str]) -> Tuple[np.ndarray | None, List[int]]:
+        """
+        Return ``(vectors, missing)`` for ``texts``.
+
+        ``vectors`` is a float32 ``(len(texts), dim)`` array with zero rows for
+        cache misses (``None`` if the cache is empty); ``missing`` lists the
+        positions of those misses.
+        """
+        keys = [self.key_for(self.model, t) for t in texts]
+        with self._lock:
+            matrix = self._matrix
+            rows = [self._rows.get(k) for k in keys]
+
+        missing = [i for i, r in enumerate(rows) if r is None]
+        if matrix is None:
+            return None, missing
+
+        vectors = np.zeros((len(texts), matrix.shape[1]), dtype=np.float32)
+        hits = [i for i, r in enumerate(rows) if r is not None]
+        if hits:
+            vectors[hits] = matrix[[rows[i] for i in hits]]
+        return vectors, missing
+
+    def put(self, texts: Sequence[str], vectors: np.ndarray):
+        """Add vectors for ``texts`` and persist the store atomically."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if len(texts) == 0:
+            return
+
+        with self._lock:
+            new_keys: List[str] = []
+            new_rows: List[int] = []
+            for i, text in enumerate(texts):
+                key = self.key_for(self.model, text)
+                if key in self._rows or key in new_keys:
+                    continue
+                new_keys.append(key)
+                new_rows.append(i)
+            if not new_keys:
+                return
+
+            if self._matrix is not None and self._matrix.shape[1] != vectors.shape[1]:
+                # Model output size changed under the same name; start over.
+                self._matrix, self._keys = None, []
+
+            added = vectors[new_rows]
+            matrix = added if self._matrix is None else np.concatenate([self._matrix, added])
+            keys = self._keys + new_keys
+            self._write(matrix, keys)
+
+    def _write(self, matrix: np.ndarray, keys: List[str]):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        matrix_file = f"{self._slug}.{uuid.uuid4().hex[:12]}.npy"
+        matrix_path = os.path.join(self.cache_dir, matrix_file)
+        np.save(matrix_path, np.ascontiguousarray(matrix, dtype=np.float32))
+
+        tmp_index = f"{self.index_path}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(tmp_index, "w", encoding="utf-8") as f:
+            json.dump({"model": self.model, "matrix": matrix_file, "keys": keys}, f)
+        os.replace(tmp_index, self.index_path)
+
+        old_file = self._matrix_file
+        self._matrix = np.load(matrix_path, mmap_mode="r")
+        self._matrix_file = matrix_file
+        self._keys = keys
+        self._rows = {k: i for i, k in enumerate(keys)}
+
+        if old_file and old_file != matrix_file:
+            try:
+                os.remove(os.path.join(self.cache_dir, old_file))
+            except OSError:
+                # Still mapped by another process (or on Windows); harmless leftover.
+                pass
@@ -5,9 +5,10 @@ Hybrid Response System - Web Scraping + KB + AI Fallback
 """
 
 import json
+from functools import lru_cache
 from typing import Dict, List, Optional
 from app.logger import logger
-from app.services.kb_service import kb_service
+from app.services.kb_service import RetrievalResult, get_kb_service
 
 
 class HybridResponseService:
@@ -19,7 +20,6 @@ class HybridResponseService:
     """
 
     def __init__(self):
-        self.kb_service = kb_service
         self.intent_responses = {
             "general": self._generate_general_response,
             "order_status": self._generate_order_response,
@@ -31,11 +31,21 @@ class HybridResponseService:
             "usage": self._generate_usage_response,
         }
 
-    def get_response(self, message: str, intent: str) -> str:
-        """মূল method - intent অনুযায়ী response generate করে"""
+    def get_response(
+        self, message: str, intent: str, retrieval: Optional[RetrievalResult] = None
+    ) -> str:
+        """
+        মূল method - intent অনুযায়ী response generate করে
+        retrieval দেওয়া থাকলে নতুন করে KB search করে না (no extra network call)
+        """
         try:
             # KB থেকে relevant items খুঁজে
-            kb_results = self.kb_service.search(message, top_k=3)
+            if retrieval is None:
+                retrieval = get_kb_service().retrieve(message, top_k=3)
+            kb_results = [
+                {"title": item.title, "content": item.answer, "score": score}
+                for item, score in retrieval.top(3)
+            ]
             
             if kb_results:
                 logger.info(f"KB found {len(kb_results)} matches for intent: {intent}")
@@ -48,6 +58,16 @@ class HybridResponseService:
             logger.error(f"Error in hybrid response: {e}")
             return self._get_default_response(intent)
 
+    def get_direct_answer(self, retrieval: RetrievalResult) -> Optional[str]:
+        """
+        Top KB match এর answer হুবহু ফেরত দেয় - exact FAQ match হলে LLM লাগে না
+        (passage হলে পুরো parent item এর answer)
+        """
+        if not retrieval:
+            return None
+        item = get_kb_service().parent_of(retrieval.results[0][0])
+        return item.answer
+
     def _build_response_from_kb(self, message: str, intent: str, kb_results: List[Dict]) -> str:
         """KB results থেকে structured response তৈরি করে"""
         
@@ -179,5 +199,7 @@ class HybridResponseService:
         return defaults.get(intent, "আপনার প্রশ্নের জন্য ধন্যবাদ। আরও সাহায্যের জন্য যোগাযোগ করুন।")
 
 
-# Singleton instance
-hybrid_service = HybridResponseService()
+@lru_cache
+def get_hybrid_service() -> HybridResponseService:
+    """Singleton instance, created on first use."""
+    return HybridResponseService()
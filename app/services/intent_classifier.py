@@ -0,0 +1,182 @@
+# File: app/services/intent_classifier.py
+
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.logger import logger
+
+# Labelled examples per intent. Their embeddings are averaged into one
+# centroid per intent; a query is classified by its closest centroid.
+INTENT_EXAMPLES: Dict[str, List[str]] = {
+    "order_status": [
+        "where is my order",
+        "has my package shipped yet",
+        "can you track my order",
+        "I never received my order",
+        "what is the status of my purchase",
+        "my clickbank receipt number is ABC123",
+    ],
+    "refund": [
+        "I want my money back",
+        "how do I get a refund",
+        "can I return the product",
+        "what is your refund policy",
+        "the product did not work, I want to return it",
+        "do you have a money back guarantee",
+    ],
+    "shipping": [
+        "how long does shipping take",
+        "do you ship internationally",
+        "how much is delivery",
+        "do you ship to Canada",
+        "which carrier do you use",
+        "will I have to pay customs duties",
+    ],
+    "subscription": [
+        "how do I cancel my subscription",
+        "can I pause my auto delivery",
+        "change the frequency of my recurring order",
+        "stop charging my card every month",
+        "how does the subscribe and save plan work",
+    ],
+    "pricing": [
+        "how much does it cost",
+        "what is the price of one bottle",
+        "do you have any discount codes",
+        "is there a bulk discount",
+        "which payment methods do you accept",
+        "is it cheaper if I buy three",
+    ],
+    "safety": [
+        "are there any side effects",
+        "is it safe to take with my medication",
+        "can I take it while pregnant",
+        "does it contain allergens",
+        "is it safe for someone with high blood pressure",
+        "should I ask my doctor first",
+    ],
+    "usage": [
+        "how many chews should I take a day",
+        "what is the recommended dosage",
+        "when is the best time to take it",
+        "should I take it with food",
+        "how long until I see results",
+        "how do I use hardchews",
+    ],
+    "general": [
+        "what is hardchews",
+        "tell me about your company",
+        "what ingredients are in it",
+        "who makes this product",
+        "can I talk to a human",
+        "what are the benefits",
+    ],
+}
+
+
+class IntentClassifier:
+    """
+    Nearest-centroid intent classifier over query embeddings.
+
+    Centroids are built once from ``INTENT_EXAMPLES``; classifying is one
+    (intents x dim) mat-vec product on the query vector the KB search
+    already computed, so it costs no network call and microseconds of CPU.
+
+    The keyword rules stay in front as a pre-filter: their intent is kept
+    when the embedding agrees or is within ``keyword_margin`` of the best
+    centroid. Otherwise the closest centroid wins if its similarity is at
+    least ``min_similarity``.
+    """
+
+    def __init__(
+        self,
+        intents: List[str],
+        centroids: np.ndarray,
+        min_similarity: float = 0.3,
+        keyword_margin: float = 0.05,
+        temperature: float = 0.05,
+    ):
+        self.intents = intents
+        self.centroids = centroids
+        self.min_similarity = min_similarity
+        self.keyword_margin = keyword_margin
+        self.temperature = temperature
+        self._index = {intent: i for i, intent in enumerate(intents)}
+
+    @classmethod
+    def build(
+        cls,
+        embed_fn: Callable[[List[str]], np.ndarray],
+        examples: Dict[str, List[str]] = INTENT_EXAMPLES,
+        **kwargs,
+    ) -> "IntentClassifier":
+        """Embed every example in one batch and average them into unit centroids."""
+        intents = list(examples)
+        texts = [text for intent in intents for text in examples[intent]]
+        vectors = np.asarray(embed_fn(texts), dtype=np.float32)
+
+        sizes = [len(examples[intent]) for intent in intents]
+        starts = np.cumsum([0] + sizes[:-1])
+        sums = np.add.reduceat(vectors, starts, axis=0)
+        centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-10)
+        return cls(intents, centroids.astype(np.float32), **kwargs)
+
+    def classify(self, q_vec: np.ndarray | None, keyword_intent: str) -> Tuple[str, Optional[float], str]:
+        """
+        Returns ``(intent, confidence, source)``. ``confidence`` is the
+        softmax weight of the chosen centroid (None without a query vector);
+        ``source`` says which signal decided.
+        """
+        if q_vec is None or q_vec.shape[0] != self.centroids.shape[1]:
+            return keyword_intent, None, "keywords"
+
+        scores = self.centroids @ q_vec
+        weights = np.exp((scores - scores.max()) / self.temperature)
+        weights /= weights.sum()
+        best = int(np.argmax(scores))
+
+        keyword_row = self._index.get(keyword_intent)
+        if keyword_intent != "general" and keyword_row is not None:
+            if scores[keyword_row] >= scores[best] - self.keyword_margin:
+                return keyword_intent, float(weights[keyword_row]), "keywords+embedding"
+        if scores[best] >= self.min_similarity:
+            return self.intents[best], float(weights[best]), "embedding"
+        return keyword_intent, float(weights[keyword_row]) if keyword_row is not None else None, "keywords"
+
+
+# One classifier per embedding model (vectors from different models are not comparable)
+_classifiers: Dict[str, IntentClassifier] = {}
+_failed_at: Dict[str, float] = {}
+_classifiers_lock = threading.Lock()
+RETRY_AFTER_SECONDS = 300.0
+
+
+def get_intent_classifier(
+    model_name: str,
+    embed_fn: Callable[[List[str]], np.ndarray],
+    **kwargs,
+) -> IntentClassifier | None:
+    """
+    Classifier for ``model_name``, built on first use with ``embed_fn``.
+    None if the examples could not be embedded; callers then rely on the
+    keyword rules alone, and the build is retried after a few minutes
+    rather than on every message.
+    """
+    classifier = _classifiers.get(model_name)
+    if classifier is not None:
+        return classifier
+    with _classifiers_lock:
+        if model_name in _classifiers:
+            return _classifiers[model_name]
+        if time.monotonic() - _failed_at.get(model_name, -RETRY_AFTER_SECONDS) < RETRY_AFTER_SECONDS:
+            return None
+        try:
+            _classifiers[model_name] = IntentClassifier.build(embed_fn, **kwargs)
+        except Exception as e:
+            _failed_at[model_name] = time.monotonic()
+            logger.warning(f"Intent classifier unavailable ({e}); using keyword rules only")
+            return None
+        return _classifiers[model_name]
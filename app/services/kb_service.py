@@ -1,70 +1,437 @@
+import hashlib
 import json
 import os
-from typing import List, Tuple
+import re
+import threading
+from typing import Any, Dict, Iterable, List, Tuple
 
 import numpy as np
-from openai import OpenAI
 
 from app.config import get_settings
+from app.logger import logger
 from app.models.schemas import KBItem
+from app.services.ann_index import IVFIndex
+from app.services.bm25_index import BM25Index
+from app.services.cache import TTLCache
+from app.services.chunking import chunk_item
+from app.services.embedding_pipeline import bulk_embed, embed_with_retry
+from app.services.embedding_provider import EmbeddingProvider, get_embedding_provider
+from app.services.embedding_store import EmbeddingStore
+from app.services.prompt_builder import KB_SEPARATOR
+from app.services.tokens import count_tokens
+from app.services.tracing import span
 
 settings = get_settings()
 
-# Create a new OpenAI client using the project's API key
-_openai_client = OpenAI(api_key=settings.OPENAI_API_KEY)
-
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 KB_DATA_DIR = os.path.join(BASE_DIR, "kb", "data")
+KB_CACHE_DIR = settings.KB_EMBEDDING_CACHE_DIR or os.path.join(BASE_DIR, "kb", "cache")
+
+KB_FILES = [
+    "complete_kb.json",
+    "faqs_comprehensive.json",
+    "products_comprehensive.json",
+    "faqs.json",
+    "products.json",
+]
+
+# Reciprocal rank fusion constant and how deep each ranking is fused.
+RRF_K = 60
+RRF_MIN_DEPTH = 20
+
+
+def normalize_query(query: str) -> str:
+    """Canonical form of a customer question used as the query-embedding cache key."""
+    text = " ".join(query.lower().split())
+    return re.sub(r"[\s?!.,;:]+$", "", text) or text
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """Scale rows to unit length as float32; all-zero rows stay zero."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-10)
+
+
+def _top_k_indices(scores: np.ndarray, top_k: int) -> np.ndarray:
+    """Indices of the ``top_k`` largest scores along the last axis, best first."""
+    n = scores.shape[-1]
+    k = min(top_k, n)
+    if k <= 0:
+        return np.empty(scores.shape[:-1] + (0,), dtype=np.intp)
+    if k < n:
+        part = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    else:
+        part = np.broadcast_to(np.arange(n), scores.shape).copy()
+    order = np.argsort(-np.take_along_axis(scores, part, axis=-1), axis=-1, kind="stable")
+    return np.take_along_axis(part, order, axis=-1)
+
+
+def _reciprocal_rank_fusion(rankings: List[np.ndarray], num_docs: int) -> np.ndarray:
+    """Sum 1 / (RRF_K + rank) over several rankings of document indices."""
+    fused = np.zeros(num_docs, dtype=np.float32)
+    for ranked in rankings:
+        fused[ranked] += 1.0 / (RRF_K + np.arange(1, len(ranked) + 1, dtype=np.float32))
+    return fused
+
+
+class KBSnapshot:
+    """
+    Immutable view of the KB that searches run against; reload swaps in a new one.
+    Passage ``i`` was cut from ``items[parent_rows[i]]`` (item IDs repeat across files).
+    """
+
+    def __init__(
+        self,
+        items: List[KBItem],
+        passages: List[KBItem],
+        parent_rows: np.ndarray,
+        embeddings: np.ndarray | None,
+        bm25: BM25Index,
+        file_state: Dict[str, Tuple[int, int, str]],
+        file_items: Dict[str, List[KBItem]],
+        ann: IVFIndex | None = None,
+    ):
+        self.items = items
+        self.passages = passages
+        self.parent_rows = parent_rows
+        self.embeddings = embeddings
+        self.bm25 = bm25
+        self.ann = ann
+        self.file_state = file_state  # filename -> (mtime_ns, size, sha256)
+        self.file_items = file_items  # filename -> items parsed from it
+        self.version = hashlib.sha256(
+            "|".join(f"{name}:{state[2]}" for name, state in sorted(file_state.items())).encode()
+        ).hexdigest()[:12]
+        if embeddings is not None:
+            embeddings.setflags(write=False)
+        self._rows = {id(passage): row for row, passage in enumerate(passages)}
+
+        # Boolean masks over passages for metadata filters, built once per snapshot.
+        self.type_masks = self._build_masks([[p.type.lower()] for p in passages])
+        self.tag_masks = self._build_masks([[t.lower() for t in p.tags] for p in passages])
+
+        # Prompt-ready text and token count of every passage (aligned with
+        # ``passages``), so prompt assembly never re-renders or re-tokenizes KB entries.
+        self.blocks: List[Tuple[str, int]] = []
+        for passage in passages:
+            text = format_kb_block(passage)
+            self.blocks.append((text, count_tokens(text)))
+
+    def row_of(self, passage: KBItem) -> int | None:
+        """Row of a passage returned by a search of this snapshot (None for any other object)."""
+        return self._rows.get(id(passage))
+
+    def _build_masks(self, labels_per_passage: List[List[str]]) -> Dict[str, np.ndarray]:
+        masks: Dict[str, np.ndarray] = {}
+        for row, labels in enumerate(labels_per_passage):
+            for label in labels:
+                if label not in masks:
+                    masks[label] = np.zeros(len(self.passages), dtype=bool)
+                masks[label][row] = True
+        for mask in masks.values():
+            mask.setflags(write=False)
+        return masks
+
+    def filter_mask(
+        self, types: Iterable[str] | None = None, tags: Iterable[str] | None = None
+    ) -> np.ndarray | None:
+        """
+        Passages matching any of ``types`` and any of ``tags`` (case-insensitive);
+        ``None`` when no filter is given.
+        """
+        mask = None
+        for labels, masks in ((types, self.type_masks), (tags, self.tag_masks)):
+            if not labels:
+                continue
+            union = np.zeros(len(self.passages), dtype=bool)
+            for label in labels:
+                hit = masks.get(label.lower())
+                if hit is not None:
+                    union |= hit
+            mask = union if mask is None else mask & union
+        return mask
+
+    @property
+    def missing_embeddings(self) -> int:
+        """Passages without a vector because embedding them failed."""
+        if self.embeddings is None:
+            return len(self.passages)
+        return int((~self.embeddings.any(axis=1)).sum())
+
+    @classmethod
+    def empty(cls) -> "KBSnapshot":
+        return cls([], [], np.empty(0, dtype=np.intp), None, BM25Index([]), {}, {})
+
+    def dense_scores(self, q_vec: np.ndarray, mask: np.ndarray | None = None) -> np.ndarray:
+        """
+        Cosine score of every passage for a unit query vector. Only passages
+        in ``mask`` and, with an ANN index, in the probed cells are scored;
+        every other passage gets -inf.
+        """
+        if mask is not None and (self.ann is None or mask.sum() <= settings.KB_ANN_MIN_ITEMS):
+            # A selective filter is cheaper (and exact) to scan directly.
+            candidates = np.flatnonzero(mask)
+        elif self.ann is None:
+            return self.embeddings @ q_vec
+        else:
+            candidates = self.ann.candidates(q_vec, settings.KB_ANN_NPROBE)
+            if mask is not None:
+                candidates = candidates[mask[candidates]]
+        scores = np.full(len(self.passages), -np.inf, dtype=np.float32)
+        scores[candidates] = self.embeddings[candidates] @ q_vec
+        return scores
 
 
 class KBService:
-    def __init__(self):
-        self.items: List[KBItem] = []
-        self.embeddings: np.ndarray | None = None
-        self._load_kb()
+    def __init__(
+        self,
+        data_dir: str = KB_DATA_DIR,
+        cache_dir: str = KB_CACHE_DIR,
+        provider: EmbeddingProvider | None = None,
+    ):
+        self.data_dir = data_dir
+        self.cache_dir = cache_dir
+        self.provider = provider or get_embedding_provider()
+        self.embedding_store = EmbeddingStore(cache_dir, self.provider.model_name)
+        self.query_cache = TTLCache(
+            maxsize=settings.QUERY_EMBEDDING_CACHE_SIZE,
+            ttl=settings.QUERY_EMBEDDING_CACHE_TTL,
+        )
+        self._reload_lock = threading.Lock()
+        self._snapshot = KBSnapshot.empty()
+        self.reload()
+
+    @property
+    def snapshot(self) -> KBSnapshot:
+        return self._snapshot
+
+    @property
+    def items(self) -> List[KBItem]:
+        return self._snapshot.items
+
+    @property
+    def passages(self) -> List[KBItem]:
+        return self._snapshot.passages
+
+    @property
+    def embeddings(self) -> np.ndarray | None:
+        return self._snapshot.embeddings
+
+    @property
+    def bm25(self) -> BM25Index:
+        return self._snapshot.bm25
 
-    def _load_kb(self):
-        """Load KB JSON files and precompute embeddings (simple in-memory store)."""
-        items: List[KBItem] = []
+    @property
+    def version(self) -> str:
+        return self._snapshot.version
+
+    def reload(self, force: bool = False) -> Dict[str, Any]:
+        """
+        Pick up edits to the KB files without a restart.
+
+        Only files whose mtime/size and content hash changed are re-parsed,
+        only items whose text changed (or whose embedding failed last time)
+        are re-embedded, and the result is swapped in atomically. With
+        ``force`` every file is re-parsed.
+        """
+        with self._reload_lock:
+            old = self._snapshot
+            file_state, file_items, changed = self._scan_files(old, force)
+            if not changed and old.file_state and not old.missing_embeddings:
+                return {
+                    "reloaded": False,
+                    "version": old.version,
+                    "changed_files": [],
+                    "items": len(old.items),
+                    "passages": len(old.passages),
+                    "embedded": 0,
+                }
+
+            items = [item for name in KB_FILES for item in file_items.get(name, [])]
+            print(f"✅ KB Service loaded {len(items)} items from knowledge base")
+
+            # Long items are indexed as overlapping passages pointing back to their parent.
+            passages: List[KBItem] = []
+            parent_rows: List[int] = []
+            for row, item in enumerate(items):
+                chunks = chunk_item(item, settings.KB_CHUNK_MAX_CHARS, settings.KB_CHUNK_OVERLAP_CHARS)
+                passages.extend(chunks)
+                parent_rows.extend([row] * len(chunks))
+            if len(passages) != len(items):
+                print(f"✅ Split into {len(passages)} passages for indexing")
+
+            # Lexical index is local and always available, with or without embeddings.
+            bm25 = BM25Index([self._item_to_search_text(p) for p in passages])
+            embeddings, embedded = self._embed_items(passages, old)
+            ann = self._build_ann(passages, embeddings)
+
+            snapshot = KBSnapshot(
+                items,
+                passages,
+                np.array(parent_rows, dtype=np.intp),
+                embeddings,
+                bm25,
+                file_state,
+                file_items,
+                ann,
+            )
+            self._snapshot = snapshot
+            return {
+                "reloaded": True,
+                "version": snapshot.version,
+                "changed_files": changed,
+                "items": len(items),
+                "passages": len(passages),
+                "embedded": embedded,
+            }
+
+    def _scan_files(self, old: KBSnapshot, force: bool):
+        """Return (file_state, file_items, changed_files), reusing parsed items of untouched files."""
+        file_state: Dict[str, Tuple[int, int, str]] = {}
+        file_items: Dict[str, List[KBItem]] = {}
+        changed: List[str] = []
 
         # Load all KB files including the new comprehensive complete_kb.json
-        for filename in ["complete_kb.json", "faqs_comprehensive.json", "products_comprehensive.json", "faqs.json", "products.json"]:
-            path = os.path.join(KB_DATA_DIR, filename)
+        for filename in KB_FILES:
+            path = os.path.join(self.data_dir, filename)
+            prev = old.file_state.get(filename)
             if not os.path.exists(path):
+                if prev:
+                    changed.append(filename)
+                continue
+
+            st = os.stat(path)
+            if not force and prev and prev[:2] == (st.st_mtime_ns, st.st_size):
+                file_state[filename] = prev
+                file_items[filename] = old.file_items[filename]
                 continue
+
             try:
-                with open(path, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                    for raw in data:
-                        items.append(KBItem(**raw))
+                with open(path, "rb") as f:
+                    raw = f.read()
+                digest = hashlib.sha256(raw).hexdigest()
+                if not force and prev and prev[2] == digest:
+                    # Touched but not edited.
+                    file_state[filename] = (st.st_mtime_ns, st.st_size, digest)
+                    file_items[filename] = old.file_items[filename]
+                    continue
+                items = [KBItem(**r) for r in json.loads(raw.decode("utf-8"))]
             except Exception as e:
                 print(f"Warning: Could not load {filename}: {e}")
+                if prev:
+                    # Keep serving the last good version of a half-written file.
+                    file_state[filename] = prev
+                    file_items[filename] = old.file_items[filename]
                 continue
 
-        self.items = items
-        print(f"✅ KB Service loaded {len(items)} items from knowledge base")
+            file_state[filename] = (st.st_mtime_ns, st.st_size, digest)
+            file_items[filename] = items
+            changed.append(filename)
 
+        return file_state, file_items, changed
+
+    def _embed_items(self, items: List[KBItem], old: KBSnapshot) -> Tuple[np.ndarray | None, int]:
+        """Unit-normalized embedding matrix for ``items`` and how many were newly embedded."""
         if not items:
-            self.embeddings = None
-            return
+            return None, 0
 
         texts = [self._item_to_text(item) for item in items]
 
-        # Use the new OpenAI client API to create embeddings
-        try:
-            resp = _openai_client.embeddings.create(
-                model="text-embedding-3-small",
-                input=texts,
+        # Vectors already in memory from the previous snapshot, then the
+        # on-disk store; only new or edited texts go to the embeddings API.
+        known: Dict[str, np.ndarray] = {}
+        if old.embeddings is not None:
+            for row, item in enumerate(old.passages):
+                if old.embeddings[row].any():
+                    known[self._item_to_text(item)] = old.embeddings[row]
+
+        pending = [i for i, t in enumerate(texts) if t not in known]
+        stored, missing_pos = self.embedding_store.fetch([texts[i] for i in pending])
+        missing = [pending[p] for p in missing_pos]
+
+        dim = next(iter(known.values())).shape[0] if known else None
+        if stored is not None:
+            dim = stored.shape[1]
+
+        fresh = None
+        if missing:
+            result = bulk_embed(
+                [texts[i] for i in missing],
+                self.provider.embed,
+                max_batch_items=settings.EMBEDDING_BATCH_SIZE,
+                max_batch_tokens=settings.EMBEDDING_BATCH_MAX_TOKENS,
+                concurrency=settings.EMBEDDING_CONCURRENCY,
+                max_retries=settings.EMBEDDING_MAX_RETRIES,
+                progress=lambda done, total: print(f"   … embedded {done}/{total} KB items"),
             )
+            if result.vectors is not None:
+                fresh = result.vectors
+                dim = fresh.shape[1]
+                ok = result.succeeded
+                print(f"✅ Embeddings generated for {len(ok)} new/changed KB items")
+                try:
+                    self.embedding_store.put([texts[missing[p]] for p in ok], fresh[ok])
+                except Exception as e:
+                    print(f"⚠️ Warning: Could not persist embedding cache: {e}")
+            if result.failed:
+                print(f"⚠️ Warning: Could not generate embeddings for {len(result.failed)} KB items")
+                if dim is None:
+                    print("Fallback: Using keyword search instead")
+                    return None, 0
+                print(f"Fallback: {len(result.failed)} KB items are found by keyword search only")
 
-            # Extract embedding vectors
-            vectors = [d.embedding for d in resp.data]
-            self.embeddings = np.array(vectors)
-            print(f"✅ Embeddings generated for {len(items)} KB items")
-        except Exception as e:
-            print(f"⚠️ Warning: Could not generate embeddings: {e}")
-            print("Fallback: Using keyword search instead")
-            self.embeddings = None
+        vectors = np.zeros((len(texts), dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            if text in known:
+                vectors[i] = known[text]
+        if stored is not None:
+            missing_set = set(missing_pos)
+            hits = [p for p in range(len(pending)) if p not in missing_set]
+            vectors[[pending[p] for p in hits]] = stored[hits]
+        if fresh is not None:
+            vectors[missing] = fresh
+
+        # Store unit vectors once so a query is scored with a single matvec.
+        embeddings = _normalize_rows(vectors)
+        print(f"✅ Embeddings ready for {len(items)} KB items ({len(items) - len(missing)} reused)")
+        return embeddings, 0 if fresh is None else len(missing) - len(result.failed)
+
+    def _build_ann(self, items: List[KBItem], embeddings: np.ndarray | None) -> IVFIndex | None:
+        """
+        IVF index for large KBs (at least KB_ANN_MIN_ITEMS items), loaded from
+        the cache directory when one was already built for the same vectors.
+        """
+        if embeddings is None or not settings.KB_ANN_ENABLED or len(items) < settings.KB_ANN_MIN_ITEMS:
+            return None
+
+        digest = hashlib.sha256(f"{self.provider.model_name}|nlist={settings.KB_ANN_NLIST}".encode())
+        for item in items:
+            digest.update(self._item_to_text(item).encode("utf-8"))
+        digest.update(np.packbits(embeddings.any(axis=1)).tobytes())
+        fingerprint = digest.hexdigest()
+
+        prefix = f"ann-{self.embedding_store._slug}-"
+        path = os.path.join(self.cache_dir, f"{prefix}{fingerprint[:16]}.npz")
+        if os.path.exists(path):
+            try:
+                ann = IVFIndex.load(path)
+                if ann.fingerprint == fingerprint and ann.ids.size == len(items):
+                    print(f"✅ ANN index loaded ({ann.nlist} cells)")
+                    return ann
+            except Exception as e:
+                print(f"⚠️ Warning: Ignoring unreadable ANN index {path}: {e}")
+
+        ann = IVFIndex.build(embeddings, nlist=settings.KB_ANN_NLIST, fingerprint=fingerprint)
+        print(f"✅ ANN index built for {len(items)} KB items ({ann.nlist} cells)")
+        try:
+            ann.save(path)
+            for name in os.listdir(self.cache_dir):
+                if name.startswith(prefix) and name != os.path.basename(path):
+                    os.remove(os.path.join(self.cache_dir, name))
+        except OSError as e:
+            print(f"⚠️ Warning: Could not persist ANN index: {e}")
+        return ann
 
     @staticmethod
     def _item_to_text(item: KBItem) -> str:
@@ -77,42 +444,258 @@ class KBService:
         parts.append(f"A: {item.answer}")
         return "\n".join(parts)
 
-    def search(self, query: str, top_k: int = 5) -> List[Tuple[KBItem, float]]:
-        """Return top_k KB items with similarity score."""
-        if not self.items or self.embeddings is None:
+    @staticmethod
+    def _item_to_search_text(item: KBItem) -> str:
+        return " ".join([item.title, item.question or "", item.answer, " ".join(item.tags)])
+
+    def search(
+        self,
+        query: str,
+        top_k: int = 5,
+        collapse: bool = True,
+        types: Iterable[str] | None = None,
+        tags: Iterable[str] | None = None,
+    ) -> List[Tuple[KBItem, float]]:
+        """
+        Return top_k KB passages with similarity score.
+
+        Dense and BM25 rankings are combined with reciprocal rank fusion; the
+        reported score is the cosine similarity. Without embeddings (or if the
+        query cannot be embedded) BM25 answers alone, scored in [0, 1].
+        With ``collapse`` only the best passage of each KB item is returned.
+        ``types``/``tags`` restrict the candidates before anything is scored.
+        """
+        snap = self._snapshot
+        if not snap.passages:
             return []
 
-        q_resp = _openai_client.embeddings.create(
-            model="text-embedding-3-small",
-            input=[query],
-        )
-        q_vec = np.array(q_resp.data[0].embedding)
+        q_vec = self._query_vector(snap, query)
+        return self._rank(snap, query, q_vec, top_k, collapse, snap.filter_mask(types, tags))
 
-        # cosine similarity
-        scores = self.embeddings @ q_vec / (
-            np.linalg.norm(self.embeddings, axis=1) * np.linalg.norm(q_vec) + 1e-10
-        )
-        idx_sorted = np.argsort(scores)[::-1][:top_k]
+    def query_vector(self, query: str) -> np.ndarray | None:
+        """Query embedding for the current KB (None when only keyword search is possible)."""
+        return self._query_vector(self._snapshot, query)
+
+    def _query_vector(self, snap: KBSnapshot, query: str) -> np.ndarray | None:
+        """Query embedding, or None if the KB has no vectors or the backend is unreachable."""
+        if snap.embeddings is None:
+            return None
+        try:
+            return self.embed_query(query)
+        except Exception as e:
+            logger.warning(f"Query embedding failed ({e}); using keyword search only")
+            return None
+
+    @staticmethod
+    def _select(snap: KBSnapshot, ranked: np.ndarray, top_k: int, collapse: bool) -> np.ndarray:
+        if not collapse:
+            return ranked[:top_k]
+        # Keep the best-ranked passage of each parent item.
+        _, first = np.unique(snap.parent_rows[ranked], return_index=True)
+        return ranked[np.sort(first)][:top_k]
+
+    @classmethod
+    def _rank(
+        cls,
+        snap: KBSnapshot,
+        query: str,
+        q_vec: np.ndarray | None,
+        top_k: int,
+        collapse: bool = True,
+        mask: np.ndarray | None = None,
+        dense: np.ndarray | None = None,
+    ) -> List[Tuple[KBItem, float]]:
+        lexical = snap.bm25.scores(query, mask)
+        depth = max(top_k * 4, RRF_MIN_DEPTH)
+        lexical_ranked = _top_k_indices(lexical, depth)
+        lexical_ranked = lexical_ranked[lexical[lexical_ranked] > 0]
+
+        if q_vec is None:
+            top = cls._select(snap, lexical_ranked, top_k, collapse)
+            return [(snap.passages[int(i)], float(lexical[int(i)])) for i in top]
+
+        if dense is None:
+            dense = snap.dense_scores(q_vec, mask)
+        dense_ranked = _top_k_indices(dense, depth)
+        dense_ranked = dense_ranked[np.isfinite(dense[dense_ranked])]
+
+        fused = _reciprocal_rank_fusion([dense_ranked, lexical_ranked], len(snap.passages))
+        ranked = _top_k_indices(fused, depth)
+        top = cls._select(snap, ranked[fused[ranked] > 0], top_k, collapse)
+        # Report true cosine scores, including for keyword-only hits the ANN probe skipped.
+        cosine = snap.embeddings[top] @ q_vec
+        return [(snap.passages[int(i)], float(c)) for i, c in zip(top, cosine)]
+
+    def parent_of(self, passage: KBItem) -> KBItem:
+        """The full KB item a passage was cut from (the item itself if it was not split)."""
+        snap = self._snapshot
+        row = snap.row_of(passage)
+        if row is None:
+            # Searched before a reload; the old snapshot's parent is gone.
+            return passage
+        return snap.items[snap.parent_rows[row]]
 
-        results: List[Tuple[KBItem, float]] = []
-        for idx in idx_sorted:
-            results.append((self.items[int(idx)], float(scores[int(idx)])))
-        return results
+    def embed_query(self, query: str) -> np.ndarray:
+        """Unit-length embedding for ``query``, served from the query cache when possible."""
+        return self.embed_queries([query])[0]
+
+    def embed_queries(self, queries: List[str]) -> np.ndarray:
+        """Embed several queries, sending only cache misses to the API in one request."""
+        keys = [normalize_query(q) for q in queries]
+        vectors: List[np.ndarray | None] = [self.query_cache.get(k) for k in keys]
+
+        missing = sorted({k for k, v in zip(keys, vectors) if v is None})
+        with span("embedding.query", queries=len(keys), cache_misses=len(missing)):
+            if missing:
+                embedded = embed_with_retry(
+                    self.provider.embed,
+                    missing,
+                    settings.QUERY_EMBEDDING_MAX_RETRIES,
+                    settings.QUERY_EMBEDDING_RETRY_BACKOFF,
+                )
+                fresh = dict(zip(missing, _normalize_rows(embedded)))
+                for key, vec in fresh.items():
+                    self.query_cache.set(key, vec)
+                vectors = [fresh[k] if v is None else v for k, v in zip(keys, vectors)]
+
+        return np.stack(vectors)
+
+    def search_many(
+        self,
+        queries: List[str],
+        top_k: int = 5,
+        collapse: bool = True,
+        types: Iterable[str] | None = None,
+        tags: Iterable[str] | None = None,
+    ) -> List[List[Tuple[KBItem, float]]]:
+        """
+        Search several queries at once: one embeddings request and one
+        matrix-matrix product for the whole batch.
+        """
+        snap = self._snapshot
+        if not queries:
+            return []
+        if not snap.passages:
+            return [[] for _ in queries]
+
+        mask = snap.filter_mask(types, tags)
+        q_mat = dense = None
+        if snap.embeddings is not None:
+            try:
+                q_mat = self.embed_queries(list(queries))
+            except Exception as e:
+                logger.warning(f"Query embedding failed ({e}); using keyword search only")
+            else:
+                if snap.ann is None and mask is None:
+                    dense = q_mat @ snap.embeddings.T
+        return [
+            self._rank(
+                snap,
+                query,
+                None if q_mat is None else q_mat[row],
+                top_k,
+                collapse,
+                mask,
+                None if dense is None else dense[row],
+            )
+            for row, query in enumerate(queries)
+        ]
+
+    def retrieve(
+        self,
+        query: str,
+        top_k: int = 5,
+        types: Iterable[str] | None = None,
+        tags: Iterable[str] | None = None,
+        query_vector: np.ndarray | None = None,
+    ) -> "RetrievalResult":
+        """
+        Run the KB search for one request. The returned object is handed to
+        every later stage (prompt building, fallback answers) so the query is
+        embedded and searched only once per message.
+
+        If the ``types``/``tags`` filter matches nothing relevant the search
+        is repeated unfiltered (reusing the same query vector). Pass
+        ``query_vector`` if the query was already embedded (``query_vector()``).
+        """
+        snap = self._snapshot
+        if not snap.passages:
+            return RetrievalResult(query, [], None, snap.version)
+
+        q_vec = query_vector if query_vector is not None else self._query_vector(snap, query)
+        with span("kb.search", passages=len(snap.passages)) as attrs:
+            mask = snap.filter_mask(types, tags)
+            results = self._rank(snap, query, q_vec, top_k, mask=mask)
+            filtered = mask is not None
+            if filtered and not results:
+                results = self._rank(snap, query, q_vec, top_k)
+                filtered = False
+            attrs["matches"] = len(results)
+        blocks = [snap.blocks[snap.row_of(item)] for item, _ in results]
+        return RetrievalResult(query, results, q_vec, snap.version, filtered, blocks)
 
     def build_context(self, query: str, top_k: int = 5) -> str:
-        results = self.search(query, top_k=top_k)
-        if not results:
-            return ""
+        return self.retrieve(query, top_k=top_k).context
+
+
+def format_kb_block(item: KBItem) -> str:
+    block = f"[{item.type.upper()}] {item.title}\n"
+    if item.question:
+        block += f"Q: {item.question}\n"
+    block += f"A: {item.answer}\n"
+    return block
+
+
+class RetrievalResult:
+    """KB search outcome for a single request."""
+
+    def __init__(
+        self,
+        query: str,
+        results: List[Tuple[KBItem, float]],
+        query_vector: np.ndarray | None = None,
+        kb_version: str = "",
+        filtered: bool = False,
+        blocks: List[Tuple[str, int]] | None = None,
+    ):
+        self.query = query
+        self.results = results
+        self.query_vector = query_vector  # None when only keyword search ran
+        self.kb_version = kb_version
+        self.filtered = filtered  # True if a metadata filter narrowed the results
+        if blocks is None:
+            blocks = [(text, count_tokens(text)) for text in (format_kb_block(i) for i, _ in results)]
+        self.blocks = blocks  # (rendered text, token count) per result, best first
+
+    def __bool__(self) -> bool:
+        return bool(self.results)
+
+    @property
+    def top_score(self) -> float:
+        return self.results[0][1] if self.results else 0.0
+
+    @property
+    def context(self) -> str:
+        return KB_SEPARATOR.join(text for text, _ in self.blocks)
+
+    def top(self, k: int) -> List[Tuple[KBItem, float]]:
+        return self.results[:k]
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """Compact form for debug_info."""
+        return [{"id": item.id, "score": round(score, 4)} for item, score in self.results]
 
-        blocks = []
-        for item, score in results:
-            block = f"[{item.type.upper()}] {item.title}\n"
-            if item.question:
-                block += f"Q: {item.question}\n"
-            block += f"A: {item.answer}\n"
-            blocks.append(block)
 
-        return "\n\n---\n\n".join(blocks)
+# Global instance, created on first use (normally by the startup warm-up task)
+_kb_service: KBService | None = None
+_kb_service_lock = threading.Lock()
 
 
-kb_service = KBService()
+def get_kb_service() -> KBService:
+    """Get or create the global KB service; concurrent first calls build it once."""
+    global _kb_service
+    if _kb_service is None:
+        with _kb_service_lock:
+            if _kb_service is None:
+                _kb_service = KBService()
+    return _kb_service
@@ -1,14 +1,22 @@
 # File: app/services/openai_service.py
 
-from typing import Dict, Any, List
+import time
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, List
 
-import openai
+from openai import AsyncOpenAI
 
 from app.config import get_settings
 from app.logger import logger
+from app.services.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.services.prompt_builder import assemble_messages
+from app.services.tracing import outbound_headers, record_span
+from app.services.usage_tracker import get_usage_tracker
+
+if TYPE_CHECKING:
+    from app.services.kb_service import RetrievalResult
 
 settings = get_settings()
-openai.api_key = settings.OPENAI_API_KEY
 
 
 SYSTEM_PROMPT = """
@@ -36,44 +44,208 @@ Answer in clear, simple English. Keep answers focused and helpful.
 """
 
 
-def generate_reply(
+# Model configuration per answer tier: (model, max_tokens)
+TIER_SMALL = "small"
+TIER_FULL = "full"
+MODEL_TIERS = {
+    TIER_SMALL: (settings.OPENAI_SMALL_MODEL, settings.OPENAI_SMALL_MAX_TOKENS),
+    TIER_FULL: (settings.OPENAI_CHAT_MODEL, settings.OPENAI_CHAT_MAX_TOKENS),
+}
+
+# Guards chat completions: a per-call deadline, and fail-fast while OpenAI is unhealthy
+chat_breaker = CircuitBreaker(
+    "openai_chat",
+    deadline=settings.OPENAI_DEADLINE,
+    failure_threshold=settings.OPENAI_BREAKER_FAILURES,
+    error_rate=settings.OPENAI_BREAKER_ERROR_RATE,
+    recovery_timeout=settings.OPENAI_BREAKER_RECOVERY,
+)
+
+
+@lru_cache
+def get_async_client() -> AsyncOpenAI:
+    """
+    One AsyncOpenAI client per process. Its HTTP connection pool is shared by
+    every in-flight conversation, so concurrent requests reuse keep-alive
+    connections instead of opening new ones.
+    """
+    return AsyncOpenAI(api_key=settings.OPENAI_API_KEY, timeout=settings.OPENAI_TIMEOUT)
+
+
+async def close_async_client():
+    """Close the pooled client's connections (called on app shutdown)."""
+    if get_async_client.cache_info().currsize:
+        await get_async_client().close()
+        get_async_client.cache_clear()
+
+
+def build_messages(
     user_message: str,
     context: str,
     extra_instructions: str | None = None,
+    retrieval: "RetrievalResult | None" = None,
+    history: List[Dict[str, str]] | None = None,
     debug_meta: Dict[str, Any] | None = None,
-    conversation_id: int | None = None,
-) -> str:
+) -> List[Dict[str, str]]:
     """
-    Safe wrapper around OpenAI ChatCompletion. If the API fails,
-    returns a fallback message that asks for human support.
+    Chat messages for one customer turn, fitted into PROMPT_TOKEN_BUDGET.
+
+    ``retrieval`` is the request's KB search result; its precomputed blocks
+    are added best first and the lowest-scoring ones dropped when over
+    budget. ``context`` (e.g. an order status) is always sent; without a
+    retrieval it is the whole KB context. ``history`` holds earlier turns
+    of the conversation, most recent last. Token stats go to ``debug_meta``.
     """
     system = SYSTEM_PROMPT
     if extra_instructions:
         system += "\n\nAdditional instructions:\n" + extra_instructions
 
-    messages: List[Dict[str, str]] = [
-        {"role": "system", "content": system},
-        {
-            "role": "user",
-            "content": f"Customer message:\n{user_message}\n\nRelevant knowledge base:\n{context}",
-        },
-    ]
+    messages, stats = assemble_messages(
+        system,
+        user_message,
+        retrieval.blocks if retrieval is not None else [],
+        extra_context=context,
+        history=history,
+        budget=settings.PROMPT_TOKEN_BUDGET,
+        history_max_tokens=settings.PROMPT_HISTORY_MAX_TOKENS,
+    )
+    if debug_meta is not None:
+        debug_meta["prompt"] = stats
+    return messages
+
+
+def _record_chat_usage(
+    model: str,
+    usage: Any,
+    started: float,
+    ok: bool,
+    conversation_id: int | None,
+    intent: str | None,
+    debug_meta: Dict[str, Any] | None,
+):
+    entry = get_usage_tracker().record(
+        "chat",
+        model,
+        prompt_tokens=getattr(usage, "prompt_tokens", 0),
+        completion_tokens=getattr(usage, "completion_tokens", 0),
+        latency=time.perf_counter() - started,
+        ok=ok,
+        conversation_id=conversation_id,
+        intent=intent,
+    )
+    if debug_meta is not None:
+        debug_meta["llm_usage"] = entry
+    record_span(
+        "openai.chat", started, ok=ok, model=model,
+        prompt_tokens=entry["prompt_tokens"], completion_tokens=entry["completion_tokens"],
+    )
+
+
+async def generate_reply(
+    user_message: str,
+    context: str,
+    extra_instructions: str | None = None,
+    debug_meta: Dict[str, Any] | None = None,
+    conversation_id: int | None = None,
+    retrieval: "RetrievalResult | None" = None,
+    history: List[Dict[str, str]] | None = None,
+    tier: str = TIER_FULL,
+    intent: str | None = None,
+) -> str:
+    """
+    Generate a reply with the OpenAI chat completions API using the
+    ``tier`` model configuration (see MODEL_TIERS), through
+    ``chat_breaker``. Raises on API errors, on missing the OPENAI_DEADLINE,
+    and with CircuitOpenError while the circuit is open; the caller answers
+    from the knowledge base instead.
+    """
+    messages = build_messages(user_message, context, extra_instructions, retrieval, history, debug_meta)
+    model, max_tokens = MODEL_TIERS[tier]
 
+    logger.info(f"Calling OpenAI chat completions ({model})")
+    started = time.perf_counter()
     try:
-        logger.info("Calling OpenAI ChatCompletion")
-        completion = openai.ChatCompletion.create(
-            model="gpt-4o-mini",
-            messages=messages,
-            temperature=0.4,
-            max_tokens=600,
+        completion = await chat_breaker.call(
+            lambda: get_async_client().chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=0.4,
+                max_tokens=max_tokens,
+                extra_headers=outbound_headers(),
+            )
         )
-        reply = completion["choices"][0]["message"]["content"].strip()
-        return reply
-    except Exception as e:
-        logger.error(f"Error calling OpenAI API: {e}")
-        # graceful fallback
-        return (
-            "I'm having trouble accessing my AI services at the moment. "
-            "I’ve recorded your question and will forward it to a human support specialist "
-            "who can follow up with you as soon as possible."
+    except CircuitOpenError:
+        raise
+    except Exception:
+        _record_chat_usage(model, None, started, False, conversation_id, intent, debug_meta)
+        raise
+    _record_chat_usage(model, completion.usage, started, True, conversation_id, intent, debug_meta)
+    reply = (completion.choices[0].message.content or "").strip()
+    if not reply:
+        raise ValueError("OpenAI returned an empty reply")
+    return reply
+
+
+async def stream_reply(
+    user_message: str,
+    context: str,
+    extra_instructions: str | None = None,
+    debug_meta: Dict[str, Any] | None = None,
+    conversation_id: int | None = None,
+    retrieval: "RetrievalResult | None" = None,
+    history: List[Dict[str, str]] | None = None,
+    tier: str = TIER_FULL,
+    intent: str | None = None,
+) -> AsyncIterator[str]:
+    """
+    Like ``generate_reply`` but yields text deltas as the model produces
+    them. The breaker and deadline cover opening the stream; errors are
+    raised to the caller, which knows whether part of the answer was
+    already forwarded.
+    """
+    messages = build_messages(user_message, context, extra_instructions, retrieval, history, debug_meta)
+    model, max_tokens = MODEL_TIERS[tier]
+
+    logger.info(f"Calling OpenAI chat completions ({model}, streaming)")
+    started_at = time.perf_counter()
+    usage = None
+    ok = False
+    try:
+        stream = await chat_breaker.call(
+            lambda: get_async_client().chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=0.4,
+                max_tokens=max_tokens,
+                stream=True,
+                # The last chunk then carries the token usage of the whole stream
+                stream_options={"include_usage": True},
+                extra_headers=outbound_headers(),
+            )
         )
+    except CircuitOpenError:
+        raise
+    except Exception:
+        _record_chat_usage(model, None, started_at, False, conversation_id, intent, debug_meta)
+        raise
+
+    try:
+        started = False
+        async for chunk in stream:
+            if chunk.usage is not None:
+                usage = chunk.usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            if not started:
+                # Drop leading whitespace, as generate_reply strips the full reply
+                delta = delta.lstrip()
+                if not delta:
+                    continue
+                started = True
+            yield delta
+        ok = True
+    finally:
+        _record_chat_usage(model, usage, started_at, ok, conversation_id, intent, debug_meta)
@@ -0,0 +1,187 @@
+# File: app/services/order_lookup.py
+
+import asyncio
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from app.config import get_settings
+from app.logger import logger
+from app.services.cache import TTLCache
+from app.services.clickbank_service import get_clickbank_service
+from app.services.shopify_service import get_shopify_service
+from app.services.single_flight import SingleFlight
+from app.services.tracing import span
+
+settings = get_settings()
+
+# Identical lookups that arrive while one is already in flight share its result
+order_flight = SingleFlight("order_lookup")
+
+FOUND = "found"
+NOT_FOUND = "not_found"
+ERROR = "error"
+CANCELLED = "cancelled"
+
+_UNCACHED = object()
+
+
+class OrderProvider:
+    """One order backend: a blocking ``find(email, number)`` and a formatter for its orders."""
+
+    def __init__(
+        self,
+        name: str,
+        label: str,
+        find: Callable[[str, Optional[str]], Optional[dict]],
+        format_status: Callable[[dict], str],
+    ):
+        self.name = name
+        self.label = label  # shown in the prompt, e.g. "[ORDER STATUS - SHOPIFY]"
+        self.find = find
+        self.format_status = format_status
+
+
+class OrderMatch:
+    def __init__(self, provider: OrderProvider, order: dict):
+        self.provider = provider
+        self.order = order
+
+    def context(self) -> str:
+        """Prompt block describing the order."""
+        return (
+            f"\n\n[ORDER STATUS - {self.provider.label}]\n"
+            + self.provider.format_status(self.order)
+            + "\nUse this info when answering the customer."
+        )
+
+
+class OrderLookup:
+    """
+    Queries every order provider concurrently; the first match wins.
+    Results, "not found" included, are cached per (provider, email, order) briefly.
+    """
+
+    def __init__(
+        self,
+        providers: List[OrderProvider],
+        cache: TTLCache | None = None,
+        negative_ttl: float | None = 60.0,
+        latency_window: int = 500,
+    ):
+        self.providers = providers
+        self.cache = cache or TTLCache(maxsize=2000, ttl=300)
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        self._counts: Dict[str, Dict[str, int]] = {
+            p.name: {FOUND: 0, NOT_FOUND: 0, ERROR: 0, CANCELLED: 0} for p in providers
+        }
+        self._latencies: Dict[str, deque] = {p.name: deque(maxlen=latency_window) for p in providers}
+
+    @staticmethod
+    def _key(provider_name: str, email: str, number: Optional[str]) -> tuple:
+        return provider_name, email.strip().lower(), str(number) if number else None
+
+    async def _query(self, provider: OrderProvider, email: str, number: Optional[str], outcomes: Dict[str, Dict]):
+        key = self._key(provider.name, email, number)
+        start = time.perf_counter()
+        outcome = ERROR
+        try:
+            with span(f"order_lookup.{provider.name}") as attrs:
+                order = await order_flight.do(key, lambda: asyncio.to_thread(provider.find, email, number))
+                attrs["found"] = bool(order)
+            outcome = FOUND if order else NOT_FOUND
+            self.cache.set(key, order, ttl=None if order else self.negative_ttl)
+            return order
+        except asyncio.CancelledError:
+            outcome = CANCELLED
+            raise
+        except Exception as e:
+            logger.error(f"{provider.name} order lookup failed: {e}")
+            return None
+        finally:
+            latency = time.perf_counter() - start
+            outcomes[provider.name] = {"outcome": outcome, "latency_ms": round(latency * 1000, 1)}
+            with self._lock:
+                self._counts[provider.name][outcome] += 1
+                if outcome != CANCELLED:
+                    self._latencies[provider.name].append(latency * 1000)
+
+    async def find(self, email: str, number: Optional[str]) -> tuple[Optional[OrderMatch], Dict[str, Dict]]:
+        """
+        Returns ``(match, outcomes)``: the first order found (None if no
+        provider has one) and per-provider outcome and latency.
+        """
+        outcomes: Dict[str, Dict] = {}
+        uncached = []
+        for provider in self.providers:
+            order = self.cache.get(self._key(provider.name, email, number), _UNCACHED)
+            if order is _UNCACHED:
+                uncached.append(provider)
+                continue
+            outcomes[provider.name] = {"outcome": FOUND if order else NOT_FOUND, "cached": True}
+            if order:
+                return OrderMatch(provider, order), outcomes
+
+        pending = {
+            asyncio.ensure_future(self._query(p, email, number, outcomes)): p for p in uncached
+        }
+        match: Optional[OrderMatch] = None
+        try:
+            while pending and match is None:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    provider = pending.pop(task)
+                    order = task.result()
+                    if order and match is None:
+                        match = OrderMatch(provider, order)
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+        return match, outcomes
+
+    def invalidate(self, provider_name: str, email: str) -> int:
+        """Forget every cached result of ``provider_name`` for ``email``; returns how many."""
+        email = email.strip().lower()
+        return self.cache.remove_where(lambda key: key[0] == provider_name and key[1] == email)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            report = {}
+            for name, counts in self._counts.items():
+                latencies = self._latencies[name]
+                report[name] = {
+                    **counts,
+                    "latency_p50_ms": round(float(np.percentile(latencies, 50)), 1) if latencies else None,
+                    "latency_p95_ms": round(float(np.percentile(latencies, 95)), 1) if latencies else None,
+                }
+            return {"providers": report, "cache": self.cache.stats()}
+
+
+@lru_cache
+def get_order_lookup() -> OrderLookup:
+    shopify = get_shopify_service()
+    clickbank = get_clickbank_service()
+    providers = [
+        OrderProvider(
+            "shopify", "SHOPIFY",
+            lambda email, number: shopify.find_order_by_email_and_number(email=email, order_number=number),
+            shopify.format_order_status_message,
+        ),
+        OrderProvider(
+            "clickbank", "CLICKBANK",
+            lambda email, number: clickbank.find_order(email=email, receipt=number or ""),
+            clickbank.format_status,
+        ),
+    ]
+    return OrderLookup(
+        providers,
+        cache=TTLCache(maxsize=settings.ORDER_CACHE_SIZE, ttl=settings.ORDER_CACHE_TTL),
+        negative_ttl=settings.ORDER_CACHE_NEGATIVE_TTL,
+    )
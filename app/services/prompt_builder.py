@@ -0,0 +1,78 @@
+# File: app/services/prompt_builder.py
+
+from typing import Any, Dict, List, Sequence, Tuple
+
+from app.services.tokens import count_tokens
+
+# Chat-format framing (role, separators) costs a few tokens per message
+MESSAGE_OVERHEAD_TOKENS = 4
+KB_SEPARATOR = "\n\n---\n\n"
+
+
+def _user_content(user_message: str, context: str) -> str:
+    return f"Customer message:\n{user_message}\n\nRelevant knowledge base:\n{context}"
+
+
+def assemble_messages(
+    system: str,
+    user_message: str,
+    kb_blocks: Sequence[Tuple[str, int]],
+    extra_context: str = "",
+    history: Sequence[Dict[str, str]] | None = None,
+    budget: int = 3000,
+    history_max_tokens: int = 1000,
+) -> Tuple[List[Dict[str, str]], Dict[str, Any]]:
+    """
+    Build the chat messages for one turn within ``budget`` prompt tokens.
+
+    The system prompt, the customer message and ``extra_context`` (e.g. an
+    order status) are always sent. Recent ``history`` is added newest first
+    up to ``history_max_tokens``. ``kb_blocks`` are ``(rendered text, token
+    count)`` pairs ranked best first; the lowest-ranked blocks are dropped
+    until the rest fits.
+
+    Returns the messages and a stats dict for debug output.
+    """
+    fixed = (
+        count_tokens(system)
+        + count_tokens(_user_content(user_message, extra_context))
+        + 2 * MESSAGE_OVERHEAD_TOKENS
+    )
+    available = max(budget - fixed, 0)
+
+    # Most recent history first, kept in chronological order
+    kept_history: List[Dict[str, str]] = []
+    history_tokens = 0
+    history_limit = min(history_max_tokens, available)
+    for message in reversed(history or []):
+        cost = count_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+        if history_tokens + cost > history_limit:
+            break
+        kept_history.insert(0, {"role": message["role"], "content": message["content"]})
+        history_tokens += cost
+    available -= history_tokens
+
+    # KB blocks in rank order; drop from the bottom until they fit
+    separator_tokens = count_tokens(KB_SEPARATOR)
+    kept_blocks = list(kb_blocks)
+    kb_tokens = sum(tokens + separator_tokens for _, tokens in kept_blocks)
+    while kept_blocks and kb_tokens > available:
+        _, tokens = kept_blocks.pop()
+        kb_tokens -= tokens + separator_tokens
+
+    context = KB_SEPARATOR.join(text for text, _ in kept_blocks)
+    if extra_context:
+        context += extra_context
+
+    messages = [{"role": "system", "content": system}]
+    messages.extend(kept_history)
+    messages.append({"role": "user", "content": _user_content(user_message, context)})
+
+    stats = {
+        "budget": budget,
+        "prompt_tokens": fixed + history_tokens + kb_tokens,
+        "kb_blocks": len(kept_blocks),
+        "kb_blocks_dropped": len(kb_blocks) - len(kept_blocks),
+        "history_messages": len(kept_history),
+    }
+    return messages, stats
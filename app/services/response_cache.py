@@ -0,0 +1,127 @@
+# File: app/services/response_cache.py
+
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Callable, Dict, Hashable, Optional
+
+import numpy as np
+
+from app.config import get_settings
+
+settings = get_settings()
+
+
+class SemanticResponseCache:
+    """
+    LRU cache of generated replies, looked up by query-embedding similarity.
+
+    Cached questions live as rows of a preallocated unit-vector matrix, so a
+    lookup is one matrix-vector product. A cached reply is returned when the
+    closest question with the same key (intent + KB version) has cosine
+    similarity >= ``threshold``. Bumping the KB version makes every older
+    entry unreachable; they age out through LRU eviction or ``ttl``.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 1000,
+        threshold: float = 0.95,
+        ttl: float | None = 86400.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.maxsize = maxsize
+        self.threshold = threshold
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._vectors: np.ndarray | None = None  # allocated on first put
+        self._key_hash = np.zeros(maxsize, dtype=np.int64)
+        self._expires = np.zeros(maxsize, dtype=np.float64)
+        self._used = np.zeros(maxsize, dtype=bool)
+        self._entries: Dict[int, tuple[Hashable, str, str]] = {}  # slot -> (key, query, reply)
+        self._lru: "OrderedDict[int, None]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _best_slot(self, q_vec: np.ndarray, key: Hashable) -> tuple[int, float]:
+        """Closest live slot for ``key`` and its similarity, or (-1, -inf)."""
+        if self._vectors is None or q_vec.shape[0] != self._vectors.shape[1]:
+            return -1, float("-inf")
+        live = self._used & (self._key_hash == hash(key)) & (self._expires > self._clock())
+        if not live.any():
+            return -1, float("-inf")
+        scores = np.where(live, self._vectors @ q_vec, -np.inf)
+        slot = int(np.argmax(scores))
+        if self._entries[slot][0] != key:  # hash collision
+            return -1, float("-inf")
+        return slot, float(scores[slot])
+
+    def get(self, q_vec: np.ndarray, intent: str, kb_version: str) -> Optional[str]:
+        """Cached reply for a question similar enough to ``q_vec``, else None."""
+        key = (intent, kb_version)
+        with self._lock:
+            slot, score = self._best_slot(q_vec, key)
+            if slot >= 0 and score >= self.threshold:
+                self._lru.move_to_end(slot)
+                self.hits += 1
+                return self._entries[slot][2]
+            self.misses += 1
+            return None
+
+    def put(self, q_vec: np.ndarray, intent: str, kb_version: str, query: str, reply: str):
+        key = (intent, kb_version)
+        q_vec = np.asarray(q_vec, dtype=np.float32)
+        with self._lock:
+            if self._vectors is None or self._vectors.shape[1] != q_vec.shape[0]:
+                # First entry, or the embedding model changed: start over.
+                self._vectors = np.zeros((self.maxsize, q_vec.shape[0]), dtype=np.float32)
+                self._clear_slots()
+
+            slot, score = self._best_slot(q_vec, key)
+            if slot < 0 or score < self.threshold:
+                if len(self._entries) < self.maxsize:
+                    slot = int(np.argmin(self._used))
+                else:
+                    slot, _ = self._lru.popitem(last=False)
+
+            self._vectors[slot] = q_vec
+            self._key_hash[slot] = hash(key)
+            self._expires[slot] = self._clock() + self.ttl if self.ttl is not None else np.inf
+            self._used[slot] = True
+            self._entries[slot] = (key, query, reply)
+            self._lru[slot] = None
+            self._lru.move_to_end(slot)
+
+    def _clear_slots(self):
+        self._used[:] = False
+        self._entries.clear()
+        self._lru.clear()
+
+    def clear(self):
+        with self._lock:
+            self._clear_slots()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+@lru_cache
+def get_response_cache() -> SemanticResponseCache:
+    return SemanticResponseCache(
+        maxsize=settings.RESPONSE_CACHE_SIZE,
+        threshold=settings.RESPONSE_CACHE_THRESHOLD,
+        ttl=settings.RESPONSE_CACHE_TTL,
+    )
@@ -1,19 +1,74 @@
 # File: app/services/router_service.py
 
+import asyncio
 import re
-from typing import Optional, Tuple
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
+
+import numpy as np
 
 from app.models.schemas import ChatwootIncomingMessage, BotReply
-from app.services.kb_service import kb_service
-from app.services.openai_service import generate_reply
-from app.services.shopify_service import shopify_service
-from app.services.clickbank_service import clickbank_service
+from app.services.intent_classifier import IntentClassifier, get_intent_classifier
+from app.services.kb_service import RetrievalResult, get_kb_service, normalize_query
+from app.services.circuit_breaker import CircuitOpenError
+from app.services.openai_service import TIER_FULL, TIER_SMALL, generate_reply, stream_reply
+from app.services.response_cache import get_response_cache
+from app.services.single_flight import SingleFlight
+from app.services.stage_graph import StageGraph
+from app.services.tracing import span
+from app.services.usage_tracker import get_usage_tracker, usage_scope
+from app.services.order_lookup import get_order_lookup
 from app.services.conversation_manager import get_conversation_manager
-from app.services.hybrid_response_service import hybrid_service
+from app.services.hybrid_response_service import get_hybrid_service
+from app.config import get_settings
 from app.logger import logger
 
+settings = get_settings()
+
 ORDER_KEYWORDS = ["where is my order", "order status", "track my order", "tracking"]
 
+# Emails and long digit runs (order numbers, phone numbers) mark a message as personal
+PERSONAL_DATA_RE = re.compile(r"[\w\.-]+@[\w\.-]+\.\w+|\d{4,}")
+
+# Identical requests that arrive while one is already in flight share its result
+# (and its OpenAI usage, charged to the conversation that started the call)
+kb_flight = SingleFlight("kb_retrieval")
+llm_flight = SingleFlight("llm")
+
+HANDOFF_WORDS = ["angry", "upset", "frustrated", "complaint", "scam"]
+
+# Answer tiers: "kb_direct" needs no LLM call; TIER_SMALL / TIER_FULL pick the model
+TIER_KB_DIRECT = "kb_direct"
+
+# Greetings and thanks with nothing else in them get a fixed reply
+SMALL_TALK = [
+    (
+        re.compile(r"^(hi|hello|hey|hiya|good (morning|afternoon|evening))[\s!.,]*(there|team|all)?[\s!.,]*$", re.I),
+        "Hi there! 👋 I'm the HardChews support assistant. How can I help you today?",
+    ),
+    (
+        re.compile(r"^(thanks|thank you|thx|ty)[\s!.,]*(so much|a lot)?[\s!.,]*$", re.I),
+        "You're welcome! Is there anything else I can help you with?",
+    ),
+]
+
+# Intents that always get the full model (personal data, medical caution)
+FULL_MODEL_INTENTS = {"order_status", "safety"}
+
+# KB tag filters per intent, applied before scoring so e.g. a refund question
+# is answered from refund/returns entries rather than product blurbs.
+INTENT_FILTERS: Dict[str, Dict[str, List[str]]] = {
+    "order_status": {"tags": ["order status", "tracking", "shipping", "delivery", "lost", "missing", "package"]},
+    "refund": {"tags": ["refund", "return", "returns", "money-back", "guarantee"]},
+    "shipping": {"tags": ["shipping", "delivery", "international", "tracking", "customs", "lost", "package"]},
+    "subscription": {"tags": ["subscription", "recurring", "auto-delivery", "auto-replenish", "billing"]},
+    "pricing": {"tags": ["price", "pricing", "cost", "discount", "bulk", "wholesale", "payment", "coupon", "promo"]},
+    "safety": {"tags": [
+        "safety", "side effects", "warning", "warnings", "medical", "medication", "interaction",
+        "pregnancy", "doctor", "contraindications", "allergens", "medical conditions",
+    ]},
+    "usage": {"tags": ["usage", "dosage", "how to take", "instructions", "directions", "how to"]},
+}
+
 
 def detect_intent(message: str) -> str:
     text = message.lower()
@@ -36,6 +91,83 @@ def detect_intent(message: str) -> str:
     return "general"
 
 
+def intent_classifier() -> Optional[IntentClassifier]:
+    """Centroid classifier for the KB's embedding model (built on first use)."""
+    kb = get_kb_service()
+    return get_intent_classifier(
+        kb.provider.model_name,
+        kb.embed_queries,
+        min_similarity=settings.INTENT_MIN_SIMILARITY,
+        keyword_margin=settings.INTENT_KEYWORD_MARGIN,
+    )
+
+
+def classify_intent(message: str, q_vec: np.ndarray | None) -> Tuple[str, Optional[float], str]:
+    """
+    Keyword rules first (fast pre-filter), then the query embedding against
+    the intent centroids. Returns ``(intent, confidence, source)``.
+    """
+    keyword_intent = detect_intent(message)
+    if q_vec is None:
+        return keyword_intent, None, "keywords"
+    classifier = intent_classifier()
+    if classifier is None:
+        return keyword_intent, None, "keywords"
+    return classifier.classify(q_vec, keyword_intent)
+
+
+def _understand(message: str) -> Tuple[Tuple[str, Optional[float], str], RetrievalResult]:
+    """Embed, classify and retrieve for one message (blocking; run in a thread)."""
+    kb = get_kb_service()
+    q_vec = kb.query_vector(message)
+    intent_result = classify_intent(message, q_vec)
+    intent, _, source = intent_result
+    # Keyword rules alone misfire (e.g. "do you take PayPal" -> usage), so only
+    # narrow the KB search when the embedding backs the intent
+    filters = INTENT_FILTERS.get(intent, {}) if "embedding" in source else {}
+    retrieval = kb.retrieve(message, 5, query_vector=q_vec, **filters)
+    return intent_result, retrieval
+
+
+def route_message(intent: str, message: str, retrieval: RetrievalResult) -> Tuple[str, str]:
+    """
+    Pick the cheapest tier that can answer well: a fixed or verbatim KB
+    answer, the small model, or the full model. Returns ``(tier, reason)``.
+    """
+    if not settings.ROUTING_ENABLED:
+        return TIER_FULL, "routing disabled"
+
+    for pattern, _ in SMALL_TALK:
+        if pattern.match(message):
+            return TIER_KB_DIRECT, "small talk"
+
+    if intent in FULL_MODEL_INTENTS:
+        return TIER_FULL, f"{intent} intent"
+    if any(w in message.lower() for w in HANDOFF_WORDS):
+        return TIER_FULL, "upset customer"
+    if not retrieval:
+        return TIER_FULL, "no KB match"
+
+    # Scores are only comparable to the thresholds when they are cosine similarities
+    if retrieval.query_vector is None:
+        return TIER_FULL, "keyword-only retrieval"
+
+    top = retrieval.top_score
+    runner_up = retrieval.results[1][1] if len(retrieval.results) > 1 else 0.0
+    if top >= settings.ROUTING_DIRECT_MIN_SCORE and top - runner_up >= settings.ROUTING_DIRECT_MIN_MARGIN:
+        return TIER_KB_DIRECT, f"exact FAQ match ({top:.2f})"
+    if top >= settings.ROUTING_SMALL_MIN_SCORE and len(message) <= settings.ROUTING_SMALL_MAX_CHARS:
+        return TIER_SMALL, f"short question with a strong KB match ({top:.2f})"
+    return TIER_FULL, f"weak KB match ({top:.2f})" if top < settings.ROUTING_SMALL_MIN_SCORE else "long message"
+
+
+def _direct_reply(turn: "_Turn") -> str:
+    for pattern, reply in SMALL_TALK:
+        if pattern.match(turn.user_message):
+            return reply
+    return get_hybrid_service().get_direct_answer(turn.retrieval)
+
+
 def extract_email_and_order(text: str) -> Tuple[Optional[str], Optional[str]]:
     # very simple heuristic; can be improved later
     email_match = re.search(r"[\w\.-]+@[\w\.-]+\.\w+", text)
@@ -49,74 +181,121 @@ def extract_email_and_order(text: str) -> Tuple[Optional[str], Optional[str]]:
     return email, receipt_or_order
 
 
-def handle_message(payload: ChatwootIncomingMessage) -> BotReply:
-    user_message = payload.content.strip()
-    conversation_id = payload.conversation.id
-    account_id = payload.conversation.account_id
-    customer_email = payload.contact.email if payload.contact else None
+class _Turn:
+    """State of one customer message between preparation and the final reply."""
+
+    def __init__(self, payload: ChatwootIncomingMessage):
+        self.user_message = payload.content.strip()
+        self.conversation_id = payload.conversation.id
+        self.account_id = payload.conversation.account_id
+        self.customer_email = payload.contact.email if payload.contact else None
+        self.intent = ""
+        self.conversation = None
+        self.retrieval: Optional[RetrievalResult] = None
+        self.context = ""  # KB blocks plus any order status
+        self.order_context = ""
+        self.history: List[Dict[str, str]] = []
+        self.extra_instructions: Optional[str] = None
+        self.used_kb = True
+        self.cacheable = False
+        self.cached_reply: Optional[str] = None
+        self.tier = TIER_FULL
+        self.direct_reply: Optional[str] = None
+        self.debug_info: Dict[str, Any] = {}
+
+
+async def _prepare_turn(payload: ChatwootIncomingMessage) -> _Turn:
+    """Everything before generation: intent, KB retrieval, order lookups, prompt extras."""
+    turn = _Turn(payload)
+    user_message = turn.user_message
 
     logger.info(f"Handling incoming message: {user_message}")
+    email, receipt_or_order = extract_email_and_order(user_message)
+
+    async def load_conversation():
+        return get_conversation_manager().create_or_get(
+            turn.conversation_id, turn.account_id, turn.customer_email
+        )
+
+    async def understand():
+        # Embed the query once, classify it and search the KB with it; the result
+        # is shared with generation and the fallback (embedding is a blocking HTTP
+        # call on a cache miss, so run it off the event loop)
+        return await kb_flight.do(
+            normalize_query(user_message),
+            lambda: asyncio.to_thread(_understand, user_message),
+        )
+
+    async def lookup_orders():
+        # Shopify and ClickBank are queried concurrently, first match wins
+        return await get_order_lookup().find(email, receipt_or_order)
 
-    # Get or create conversation session
-    conv_manager = get_conversation_manager()
-    conversation = conv_manager.create_or_get(conversation_id, account_id, customer_email)
+    async def order_status(understand):
+        (intent, _, _), _ = understand
+        if intent != "order_status":
+            graph.cancel("orders")
+            return None
+        if "orders" in graph:
+            return await graph.result("orders")
+        # Only the embedding classified this as an order question: look up now
+        return await lookup_orders() if email else None
 
-    intent = detect_intent(user_message)
-    logger.info(f"Detected intent: {intent}")
+    # Conversation load, KB search and order lookups are independent and run
+    # concurrently; the turn is ready after the longest of them
+    graph = StageGraph("prepare_turn")
+    graph.add("conversation", load_conversation)
+    graph.add("understand", understand)
+    if email and detect_intent(user_message) == "order_status":
+        # The keyword pre-filter already says this is about an order: start the
+        # lookup without waiting for the embedding. Other messages with an email
+        # never reach Shopify or ClickBank unless classified as order status.
+        graph.add("orders", lookup_orders)
+    graph.add("order_status", order_status, deps=["understand"])
+    # The query embedding runs before the intent is known; it is charged to
+    # this conversation and intent once classification is done
+    with usage_scope(turn.conversation_id) as usage:
+        stages = await graph.run()
 
-    # Build KB context
-    context = kb_service.build_context(user_message, top_k=5)
+    conversation = stages["conversation"]
+    turn.conversation = conversation
+    (intent, confidence, source), retrieval = stages["understand"]
+    turn.intent = intent
+    get_usage_tracker().attribute(usage, intent)
+    turn.retrieval = retrieval
+    logger.info(f"Detected intent: {intent} (confidence {confidence}, from {source})")
+    order_context = ""
 
     extra_instructions: Optional[str] = None
-    used_kb = True
-    handoff = False
-    handoff_reason: Optional[str] = None
     debug_info = {
         "intent": intent,
-        "conversation_message_count": len(conversation.messages)
+        "intent_confidence": round(confidence, 4) if confidence is not None else None,
+        "intent_source": source,
+        "conversation_message_count": len(conversation.messages),
+        "kb_matches": retrieval.summary(),
+        "kb_filtered": retrieval.filtered,
+        "stages": graph.timings,
     }
+    turn.debug_info = debug_info
 
     # Special handling for ORDER STATUS
     if intent == "order_status":
-        email, receipt_or_order = extract_email_and_order(user_message)
         debug_info["email_extracted"] = email
         debug_info["order_or_receipt_extracted"] = receipt_or_order
 
         if email:
-            # 1) Try Shopify
-            shopify_order = shopify_service.find_order_by_email_and_number(
-                email=email, order_number=receipt_or_order
-            )
-            if shopify_order:
-                logger.info("Found Shopify order for customer")
-                status_msg = shopify_service.format_order_status_message(shopify_order)
-                context += (
-                    "\n\n[ORDER STATUS - SHOPIFY]\n"
-                    + status_msg
-                    + "\nUse this info when answering the customer."
-                )
+            match, outcomes = stages["order_status"]
+            debug_info["order_lookups"] = outcomes
+            if match:
+                logger.info(f"Found {match.provider.name} order for customer")
+                order_context += match.context()
             else:
-                # 2) Try ClickBank
-                logger.info("Shopify order not found, trying ClickBank")
-                cb_order = clickbank_service.find_order(
-                    email=email, receipt=receipt_or_order or ""
+                logger.info("No order found in Shopify or ClickBank")
+                extra_instructions = (
+                    "You could not find an order in Shopify or ClickBank "
+                    "with the given details. Politely ask the customer to confirm "
+                    "their email and order/receipt number, and let them know "
+                    "that a human support agent may need to review it."
                 )
-                if cb_order:
-                    logger.info("Found ClickBank order for customer")
-                    status_msg = clickbank_service.format_status(cb_order)
-                    context += (
-                        "\n\n[ORDER STATUS - CLICKBANK]\n"
-                        + status_msg
-                        + "\nUse this info when answering the customer."
-                    )
-                else:
-                    logger.info("No order found in Shopify or ClickBank")
-                    extra_instructions = (
-                        "You could not find an order in Shopify or ClickBank "
-                        "with the given details. Politely ask the customer to confirm "
-                        "their email and order/receipt number, and let them know "
-                        "that a human support agent may need to review it."
-                    )
         else:
             extra_instructions = (
                 "The customer asked about order status but did not provide an email. "
@@ -124,9 +303,11 @@ def handle_message(payload: ChatwootIncomingMessage) -> BotReply:
                 "their order number or ClickBank receipt number."
             )
 
+    context = retrieval.context + order_context
+
     # If KB context is empty, be more cautious
     if not context:
-        used_kb = False
+        turn.used_kb = False
         extra_instructions = (
             (extra_instructions or "")
             + "\nYou have no relevant knowledge base entries for this question. "
@@ -140,31 +321,92 @@ def handle_message(payload: ChatwootIncomingMessage) -> BotReply:
         + f"\n\nThis is message #{len(conversation.messages) + 1} in the conversation. "
         "Remember context from previous messages and maintain continuity."
     )
+    turn.context = context
+    turn.order_context = order_context
+    turn.history = conversation.get_context_window(settings.PROMPT_HISTORY_MAX_MESSAGES)
+    turn.extra_instructions = extra_instructions
 
-    # Try OpenAI first, fallback to Hybrid KB Service
-    try:
-        reply_text = generate_reply(
-            user_message=user_message,
-            context=context,
-            extra_instructions=extra_instructions,
-            debug_meta=debug_info,
-            conversation_id=conversation_id,
+    turn.tier, reason = route_message(intent, user_message, retrieval)
+    debug_info["route"] = {"tier": turn.tier, "reason": reason}
+    logger.info(f"Routing to {turn.tier}: {reason}")
+    if turn.tier == TIER_KB_DIRECT:
+        turn.direct_reply = _direct_reply(turn)
+
+    # FAQ-style questions reuse the reply to an earlier, near-identical question.
+    # Order-status turns and messages with personal data are never cached, and
+    # neither are follow-ups: their reply is generated from the conversation
+    # history, which the cache key does not cover and may hold another
+    # customer's order details.
+    turn.cacheable = (
+        turn.direct_reply is None
+        and settings.RESPONSE_CACHE_ENABLED
+        and retrieval.query_vector is not None
+        and intent != "order_status"
+        and not PERSONAL_DATA_RE.search(user_message)
+        and not turn.history
+    )
+    if turn.cacheable:
+        turn.cached_reply = get_response_cache().get(retrieval.query_vector, intent, retrieval.kb_version)
+    debug_info["response_cache"] = (
+        "hit" if turn.cached_reply is not None else ("miss" if turn.cacheable else "skip")
+    )
+    if turn.cached_reply is not None:
+        logger.info("Answered from the semantic response cache")
+    return turn
+
+
+def _generation_kwargs(turn: _Turn) -> Dict[str, Any]:
+    return {
+        "user_message": turn.user_message,
+        "context": turn.order_context,
+        "extra_instructions": turn.extra_instructions,
+        "debug_meta": turn.debug_info,
+        "conversation_id": turn.conversation_id,
+        "retrieval": turn.retrieval,
+        "history": turn.history,
+        "tier": turn.tier,
+        "intent": turn.intent,
+    }
+
+
+def _fallback_reply(turn: _Turn, error: Exception) -> str:
+    """Hybrid KB Service answer, used when OpenAI failed, timed out or is circuit-broken."""
+    if isinstance(error, CircuitOpenError):
+        logger.info("OpenAI circuit is open, using Hybrid KB Service")
+    else:
+        logger.warning(f"OpenAI API failed ({type(error).__name__}: {error}), using Hybrid KB Service instead")
+    turn.debug_info["llm_fallback"] = type(error).__name__
+    with span("kb_fallback"):
+        reply_text = get_hybrid_service().get_response(turn.user_message, turn.intent, retrieval=turn.retrieval)
+    if turn.context:
+        reply_text += f"\n\n[📚 Knowledge Base Match]"
+    return reply_text
+
+
+def _remember_reply(turn: _Turn, reply_text: str):
+    """Store a freshly generated reply in the semantic response cache."""
+    if turn.cacheable and reply_text:
+        retrieval = turn.retrieval
+        get_response_cache().put(
+            retrieval.query_vector, turn.intent, retrieval.kb_version, turn.user_message, reply_text
         )
-        logger.info("Successfully generated reply using OpenAI API")
-    except Exception as e:
-        logger.warning(f"OpenAI API failed ({e}), using Hybrid KB Service instead")
-        # Fallback to Hybrid Response Service - KB based answers
-        reply_text = hybrid_service.get_response(user_message, intent)
-        if context:
-            reply_text += f"\n\n[📚 Knowledge Base Match]"
+
+
+def _finish_turn(turn: _Turn, reply_text: str) -> BotReply:
+    """Record the exchange in the conversation history and decide on handoff."""
+    user_message = turn.user_message
+    intent = turn.intent
+    conversation = turn.conversation
+    handoff = False
+    handoff_reason: Optional[str] = None
 
     # Add messages to conversation history
     conversation.add_message("user", user_message, {"intent": intent})
-    conversation.add_message("assistant", reply_text, {"debug_info": debug_info})
+    conversation.add_message("assistant", reply_text, {"debug_info": turn.debug_info})
 
     # Decide handoff conditions (simple rule-set)
     lower = user_message.lower()
-    if any(w in lower for w in ["angry", "upset", "frustrated", "complaint", "scam"]):
+    if any(w in lower for w in HANDOFF_WORDS):
         handoff = True
         handoff_reason = "Customer seems upset/frustrated; better handled by a human."
 
@@ -173,7 +415,7 @@ def handle_message(payload: ChatwootIncomingMessage) -> BotReply:
         # If still on complex topics and many messages, suggest handoff
         if intent in ["order_status", "refund", "shipping"] and len(conversation.messages) % 6 == 0:
             logger.info("Escalating due to conversation length")
-            extra_instructions = (
+            turn.extra_instructions = (
                 "The customer has been in this conversation for a while. "
                 "If you haven't resolved the issue, offer to connect them with a specialist."
             )
@@ -183,7 +425,68 @@ def handle_message(payload: ChatwootIncomingMessage) -> BotReply:
         should_handoff=handoff,
         handoff_reason=handoff_reason,
         detected_intent=intent,
-        used_kb=used_kb,
-        debug_info=debug_info,
+        used_kb=turn.used_kb,
+        debug_info=turn.debug_info,
     )
 
+
+async def handle_message(payload: ChatwootIncomingMessage) -> BotReply:
+    turn = await _prepare_turn(payload)
+
+    # Try OpenAI first, fallback to Hybrid KB Service
+    reply_text = turn.direct_reply or turn.cached_reply
+    if reply_text is None:
+        try:
+            # Same prompt -> same completion, so concurrent identical turns share one call
+            with span("generate", tier=turn.tier):
+                reply_text = await llm_flight.do(
+                    (
+                        turn.tier,
+                        turn.user_message,
+                        turn.context,
+                        turn.extra_instructions,
+                        tuple((m["role"], m["content"]) for m in turn.history),
+                    ),
+                    lambda: generate_reply(**_generation_kwargs(turn)),
+                )
+            logger.info("Successfully generated reply using OpenAI API")
+            _remember_reply(turn, reply_text)
+        except Exception as e:
+            reply_text = _fallback_reply(turn, e)
+
+    return _finish_turn(turn, reply_text)
+
+
+async def stream_message(payload: ChatwootIncomingMessage) -> AsyncIterator[Union[str, BotReply]]:
+    """
+    Streaming variant of ``handle_message``: yields reply text pieces as the
+    model produces them, then the final ``BotReply`` once the full text has
+    been recorded in the conversation history.
+    """
+    turn = await _prepare_turn(payload)
+
+    ready_reply = turn.direct_reply or turn.cached_reply
+    if ready_reply is not None:
+        yield ready_reply
+        yield _finish_turn(turn, ready_reply)
+        return
+
+    parts: List[str] = []
+    try:
+        with span("generate", tier=turn.tier, stream=True) as attrs:
+            async for delta in stream_reply(**_generation_kwargs(turn)):
+                parts.append(delta)
+                yield delta
+            attrs["chunks"] = len(parts)
+        logger.info("Successfully streamed reply using OpenAI API")
+        _remember_reply(turn, "".join(parts))
+    except Exception as e:
+        if parts:
+            # The customer already saw part of the answer; keep what was sent.
+            logger.warning(f"OpenAI stream broke off ({e}) after {len(parts)} chunks")
+        else:
+            fallback = _fallback_reply(turn, e)
+            parts.append(fallback)
+            yield fallback
+
+    yield _finish_turn(turn, "".join(parts))
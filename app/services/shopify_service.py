@@ -1,9 +1,11 @@
 # File: app/services/shopify_service.py
 
+from functools import lru_cache
 from typing import Optional
 import requests
 
 from app.config import get_settings
+from app.services.tracing import outbound_headers
 
 settings = get_settings()
 
@@ -20,6 +22,7 @@ class ShopifyService:
         return {
             "X-Shopify-Access-Token": self.access_token,
             "Content-Type": "application/json",
+            **outbound_headers(),
         }
 
     def find_order_by_email_and_number(
@@ -69,4 +72,6 @@ class ShopifyService:
         )
 
 
-shopify_service = ShopifyService()
+@lru_cache
+def get_shopify_service() -> ShopifyService:
+    return ShopifyService()
@@ -0,0 +1,52 @@
+# File: app/services/single_flight.py
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key into one in-flight task.
+
+    The first caller for a key starts ``fn()``; callers arriving while it is
+    still running await the same future and get the same result (or
+    exception). Once it finishes the key is forgotten, so this is not a
+    cache: the next call starts a fresh one. A waiter being cancelled does
+    not cancel the shared task.
+    """
+
+    def __init__(self, name: str = ""):
+        self.name = name
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future)
+
+        self.calls += 1
+        future = asyncio.ensure_future(fn())
+        self._inflight[key] = future
+
+        def _forget(done: asyncio.Future):
+            if self._inflight.get(key) is done:
+                del self._inflight[key]
+            if not done.cancelled():
+                done.exception()  # mark retrieved even if every waiter went away
+
+        future.add_done_callback(_forget)
+        return await asyncio.shield(future)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.calls + self.coalesced
+        return {
+            "in_flight": len(self._inflight),
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "coalesced_rate": round(self.coalesced / total, 4) if total else 0.0,
+        }
@@ -0,0 +1,81 @@
+# File: app/services/stage_graph.py
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, Tuple
+
+from app.services.tracing import span
+
+
+class StageGraph:
+    """
+    Async stages that start together and each wait only for their dependencies.
+    A stage gets its dependencies' results as keyword arguments.
+    """
+
+    def __init__(self, name: str = ""):
+        self.name = name
+        self._stages: Dict[str, Tuple[Callable[..., Awaitable[Any]], Tuple[str, ...]]] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._started = 0.0
+        self.timings: Dict[str, Dict[str, Any]] = {}
+
+    def add(self, name: str, fn: Callable[..., Awaitable[Any]], deps: Iterable[str] = ()) -> "StageGraph":
+        deps = tuple(deps)
+        if name in self._stages:
+            raise ValueError(f"Stage {name!r} already added")
+        missing = [dep for dep in deps if dep not in self._stages]
+        if missing:
+            raise ValueError(f"Stage {name!r} depends on unknown stage(s) {missing}")
+        self._stages[name] = (fn, deps)
+        return self
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._stages
+
+    def _offset_ms(self) -> float:
+        return round((time.perf_counter() - self._started) * 1000, 1)
+
+    async def _run_stage(self, name: str) -> Any:
+        fn, deps = self._stages[name]
+        kwargs = {dep: await self.result(dep) for dep in deps}
+        timing = self.timings[name] = {"start_ms": self._offset_ms()}
+        try:
+            with span(f"{self.name}.{name}" if self.name else name):
+                result = await fn(**kwargs)
+        except asyncio.CancelledError:
+            timing["status"] = "cancelled"
+            raise
+        except Exception:
+            timing["status"] = "failed"
+            raise
+        finally:
+            timing["end_ms"] = self._offset_ms()
+        timing["status"] = "done"
+        return result
+
+    async def result(self, name: str) -> Any:
+        """Wait for one stage (the caller being cancelled does not cancel the stage)."""
+        return await asyncio.shield(self._tasks[name])
+
+    def cancel(self, name: str):
+        task = self._tasks.get(name)
+        if task is not None and not task.done():
+            task.cancel()
+
+    async def run(self) -> Dict[str, Any]:
+        """Run every stage; returns the results of the stages that were not cancelled."""
+        self._started = time.perf_counter()
+        self._tasks = {name: asyncio.ensure_future(self._run_stage(name)) for name in self._stages}
+        try:
+            done, _ = await asyncio.wait(self._tasks.values(), return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                if not task.cancelled() and task.exception() is not None:
+                    raise task.exception()
+        finally:
+            pending = [task for task in self._tasks.values() if not task.done()]
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+        return {name: task.result() for name, task in self._tasks.items() if not task.cancelled()}
@@ -0,0 +1,34 @@
+# File: app/services/tokens.py
+
+from functools import lru_cache
+
+from app.services.embedding_pipeline import estimate_tokens
+
+try:  # optional: exact counts when tiktoken is installed
+    import tiktoken
+except ImportError:  # pragma: no cover - depends on the environment
+    tiktoken = None
+
+# Encoding used by the gpt-4o model family
+ENCODING_NAME = "o200k_base"
+
+
+@lru_cache
+def _encoding():
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding(ENCODING_NAME)
+    except Exception:
+        # Encoding files are downloaded on first use; offline we estimate instead.
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Tokens in ``text`` for the chat model; a ~4 chars/token estimate without tiktoken."""
+    if not text:
+        return 0
+    enc = _encoding()
+    if enc is None:
+        return estimate_tokens(text)
+    return len(enc.encode(text, disallowed_special=()))
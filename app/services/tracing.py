@@ -0,0 +1,218 @@
+# File: app/services/tracing.py
+
+import asyncio
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional
+
+from app.config import get_settings
+
+settings = get_settings()
+
+REQUEST_ID_HEADER = "X-Request-ID"
+
+# The trace of the request being handled. Context variables follow the request
+# into asyncio tasks and asyncio.to_thread workers, so spans opened anywhere in
+# the pipeline land in the right trace.
+_current_trace: ContextVar[Optional["Trace"]] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Optional[int]] = ContextVar("current_span", default=None)
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex
+
+
+def _track() -> str:
+    """Where a span runs: the asyncio task, or the worker thread outside the loop."""
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    return task.get_name() if task is not None else threading.current_thread().name
+
+
+class Trace:
+    """
+    Timed spans of one request, one per pipeline hop.
+    ``trace_events()`` exports them in the Chrome trace event format.
+    """
+
+    def __init__(self, request_id: str, name: str = ""):
+        self.request_id = request_id
+        self.name = name
+        self.started_at = time.time()
+        self._t0 = time.perf_counter()
+        self.duration_ms: Optional[float] = None
+        self.spans: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def offset_ms(self, perf_time: float) -> float:
+        return round((perf_time - self._t0) * 1000, 2)
+
+    def _open(self, name: str, attrs: Dict[str, Any], started: float) -> Dict[str, Any]:
+        with self._lock:
+            span = {
+                "id": len(self.spans),
+                "name": name,
+                "parent": _current_span.get(),
+                "start_ms": self.offset_ms(started),
+                "duration_ms": None,
+                "status": "running",
+                "track": _track(),
+                "attrs": attrs,
+            }
+            self.spans.append(span)
+            return span
+
+    def finish(self):
+        self.duration_ms = self.offset_ms(time.perf_counter())
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = [
+                {key: value for key, value in span.items() if key != "track"}
+                for span in sorted(self.spans, key=lambda s: s["start_ms"])
+            ]
+        return {
+            "request_id": self.request_id,
+            "name": self.name,
+            "duration_ms": self.duration_ms,
+            "spans": spans,
+        }
+
+    def trace_events(self) -> List[Dict[str, Any]]:
+        """Complete ("X") events, one per finished span, plus track names."""
+        start_us = self.started_at * 1_000_000
+        tids: Dict[str, int] = {}
+        events: List[Dict[str, Any]] = []
+        with self._lock:
+            for span in self.spans:
+                if span["duration_ms"] is None:
+                    continue
+                tid = tids.setdefault(span["track"], len(tids) + 1)
+                events.append({
+                    "name": span["name"],
+                    "cat": "pipeline",
+                    "ph": "X",
+                    "ts": round(start_us + span["start_ms"] * 1000),
+                    "dur": round(span["duration_ms"] * 1000),
+                    "pid": 1,
+                    "tid": tid,
+                    "args": {**span["attrs"], "status": span["status"], "request_id": self.request_id},
+                })
+        events.extend(
+            {"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": track}}
+            for track, tid in tids.items()
+        )
+        return events
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def current_request_id() -> Optional[str]:
+    trace = _current_trace.get()
+    return trace.request_id if trace is not None else None
+
+
+def outbound_headers() -> Dict[str, str]:
+    """Headers that carry the request ID to Shopify, ClickBank, Chatwoot and OpenAI."""
+    request_id = current_request_id()
+    return {REQUEST_ID_HEADER: request_id} if request_id else {}
+
+
+@contextmanager
+def start_trace(name: str, request_id: Optional[str] = None, finish: bool = True) -> Iterator[Trace]:
+    """
+    Make a new trace current for the enclosed block. With ``finish=False``
+    the caller ends it with ``trace.finish()`` (e.g. once a streamed body
+    has been sent); spans from tasks started in the block still land in it.
+    """
+    trace = Trace(request_id or new_request_id(), name)
+    trace_token = _current_trace.set(trace)
+    span_token = _current_span.set(None)
+    try:
+        yield trace
+    finally:
+        if finish:
+            trace.finish()
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+
+
+@contextmanager
+def span(name: str, **attrs) -> Iterator[Dict[str, Any]]:
+    """
+    Time the enclosed block as a span of the current trace. Yields the
+    span's attribute dict so the block can add results (outcome, tokens).
+    Without a trace (scripts, tests) this only yields the attributes.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield attrs
+        return
+    started = time.perf_counter()
+    record = trace._open(name, attrs, started)
+    token = _current_span.set(record["id"])
+    status = "error"
+    try:
+        yield attrs
+        status = "ok"
+    except (asyncio.CancelledError, GeneratorExit):
+        status = "cancelled"
+        raise
+    finally:
+        record["duration_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        record["status"] = status
+        _current_span.reset(token)
+
+
+def record_span(name: str, started: float, ok: bool = True, **attrs):
+    """Add a span that began at ``started`` (a time.perf_counter() value) and ends now."""
+    trace = _current_trace.get()
+    if trace is None:
+        return
+    record = trace._open(name, attrs, started)
+    record["duration_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    record["status"] = "ok" if ok else "error"
+
+
+class TraceRecorder:
+    """The most recent request traces, for /admin/traces."""
+
+    def __init__(self, maxsize: int = 200):
+        self._traces: deque = deque(maxlen=maxsize)
+        self._lock = threading.Lock()
+
+    def add(self, trace: Trace):
+        with self._lock:
+            self._traces.append(trace)
+
+    def get(self, request_id: str) -> Optional[Trace]:
+        with self._lock:
+            return next((t for t in reversed(self._traces) if t.request_id == request_id), None)
+
+    def recent(self, min_duration_ms: float = 0.0, limit: int = 50) -> List[Dict[str, Any]]:
+        with self._lock:
+            traces = [t for t in reversed(self._traces) if (t.duration_ms or 0.0) >= min_duration_ms]
+        return [
+            {
+                "request_id": t.request_id,
+                "name": t.name,
+                "started_at": t.started_at,
+                "duration_ms": t.duration_ms,
+                "spans": len(t.spans),
+            }
+            for t in traces[:limit]
+        ]
+
+
+@lru_cache
+def get_trace_recorder() -> TraceRecorder:
+    return TraceRecorder(settings.TRACE_BUFFER_SIZE)
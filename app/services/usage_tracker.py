@@ -0,0 +1,195 @@
+# File: app/services/usage_tracker.py
+
+import threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+from app.logger import logger
+
+# USD per 1M tokens: (prompt, completion). Unknown models are counted at zero cost.
+MODEL_PRICES: Dict[str, tuple[float, float]] = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4.1-nano": (0.10, 0.40),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "text-embedding-3-small": (0.02, 0.0),
+    "text-embedding-3-large": (0.13, 0.0),
+}
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    prompt_price, completion_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+
+
+def empty_totals() -> Dict[str, Any]:
+    return {
+        "calls": 0,
+        "errors": 0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "cost_usd": 0.0,
+        "latency_ms_total": 0.0,
+    }
+
+
+def add_to_totals(totals: Dict[str, Any], entry: Dict[str, Any]):
+    """Fold one usage entry (see ``UsageTracker.record``) into a totals dict."""
+    totals["calls"] += 1
+    totals["errors"] += 0 if entry["ok"] else 1
+    totals["prompt_tokens"] += entry["prompt_tokens"]
+    totals["completion_tokens"] += entry["completion_tokens"]
+    totals["cost_usd"] += entry["cost_usd"]
+    totals["latency_ms_total"] += entry["latency_ms"]
+
+
+def _report(totals: Dict[str, Any]) -> Dict[str, Any]:
+    calls = totals["calls"]
+    return {
+        **totals,
+        "cost_usd": round(totals["cost_usd"], 6),
+        "latency_ms_total": round(totals["latency_ms_total"], 1),
+        "avg_latency_ms": round(totals["latency_ms_total"] / calls, 1) if calls else 0.0,
+    }
+
+
+class UsageScope:
+    """
+    Conversation and intent that OpenAI calls in the current context are charged to.
+    Calls made before the intent is known wait in ``pending``.
+    """
+
+    def __init__(self, conversation_id: Optional[int]):
+        self.conversation_id = conversation_id
+        self.intent: Optional[str] = None
+        self.attributed = False
+        self.pending: List[Dict[str, Any]] = []
+
+
+# Like the request trace, this follows the turn into asyncio tasks and
+# asyncio.to_thread workers, so embedding calls deep in the KB service are
+# charged without threading the conversation through every signature.
+_usage_scope: ContextVar[Optional[UsageScope]] = ContextVar("usage_scope", default=None)
+
+
+@contextmanager
+def usage_scope(conversation_id: Optional[int]) -> Iterator[UsageScope]:
+    scope = UsageScope(conversation_id)
+    token = _usage_scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _usage_scope.reset(token)
+
+
+class UsageTracker:
+    """
+    Tokens, latency and cost of OpenAI calls, per kind, model, intent and conversation.
+    A call shared through single-flight is charged once, to the turn that started it.
+    """
+
+    def __init__(self, latency_window: int = 1000):
+        self._lock = threading.Lock()
+        self.totals = empty_totals()
+        self.by_kind: Dict[str, Dict[str, Any]] = {}
+        self.by_model: Dict[str, Dict[str, Any]] = {}
+        self.by_intent: Dict[str, Dict[str, Any]] = {}
+        self._latencies: Dict[str, deque] = {}
+        self._latency_window = latency_window
+
+    def record(
+        self,
+        kind: str,
+        model: str,
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0,
+        latency: float = 0.0,
+        ok: bool = True,
+        conversation_id: Optional[int] = None,
+        intent: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Record one call; ``kind`` is "chat" or "embedding", ``latency`` in seconds."""
+        scope = _usage_scope.get()
+        deferred = False
+        if scope is not None and conversation_id is None and intent is None:
+            if scope.attributed:
+                conversation_id, intent = scope.conversation_id, scope.intent
+            else:
+                deferred = True
+        entry = {
+            "kind": kind,
+            "model": model,
+            "prompt_tokens": int(prompt_tokens or 0),
+            "completion_tokens": int(completion_tokens or 0),
+            "cost_usd": estimate_cost(model, prompt_tokens or 0, completion_tokens or 0),
+            "latency_ms": latency * 1000,
+            "ok": ok,
+        }
+        with self._lock:
+            add_to_totals(self.totals, entry)
+            add_to_totals(self.by_kind.setdefault(kind, empty_totals()), entry)
+            add_to_totals(self.by_model.setdefault(model, empty_totals()), entry)
+            if intent:
+                add_to_totals(self.by_intent.setdefault(intent, empty_totals()), entry)
+            self._latencies.setdefault(kind, deque(maxlen=self._latency_window)).append(entry["latency_ms"])
+            if deferred:
+                scope.pending.append(entry)
+
+        if conversation_id is not None:
+            _record_conversation_usage(conversation_id, entry)
+
+        logger.info(
+            f"OpenAI {kind} call ({model}): {entry['prompt_tokens']}+{entry['completion_tokens']} tokens, "
+            f"{entry['latency_ms']:.0f} ms, ${entry['cost_usd']:.6f}{'' if ok else ', failed'}"
+        )
+        return entry
+
+    def attribute(self, scope: UsageScope, intent: Optional[str]):
+        """
+        Charge the scope's pending calls to its conversation and ``intent``;
+        calls recorded in the scope from now on are charged directly.
+        """
+        with self._lock:
+            scope.intent = intent
+            scope.attributed = True
+            pending, scope.pending = scope.pending, []
+            if intent:
+                for entry in pending:
+                    add_to_totals(self.by_intent.setdefault(intent, empty_totals()), entry)
+        if scope.conversation_id is not None:
+            for entry in pending:
+                _record_conversation_usage(scope.conversation_id, entry)
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            latency = {
+                kind: {
+                    "p50_ms": round(float(np.percentile(values, 50)), 1),
+                    "p95_ms": round(float(np.percentile(values, 95)), 1),
+                }
+                for kind, values in self._latencies.items()
+                if values
+            }
+            return {
+                "totals": _report(self.totals),
+                "by_kind": {k: _report(v) for k, v in self.by_kind.items()},
+                "by_model": {k: _report(v) for k, v in self.by_model.items()},
+                "by_intent": {k: _report(v) for k, v in self.by_intent.items()},
+                "recent_latency": latency,
+            }
+
+
+def _record_conversation_usage(conversation_id: int, entry: Dict[str, Any]):
+    # Imported here: conversation_manager imports this module
+    from app.services.conversation_manager import get_conversation_manager
+    get_conversation_manager().record_usage(conversation_id, entry)
+
+
+@lru_cache
+def get_usage_tracker() -> UsageTracker:
+    return UsageTracker()
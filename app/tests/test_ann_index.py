@@ -0,0 +1,77 @@
+# File: app/tests/test_ann_index.py
+
+import numpy as np
+
+from app.services.ann_index import IVFIndex
+
+
+def _clustered_vectors(n=4000, dim=32, clusters=40, seed=1):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    x = centers[rng.integers(clusters, size=n)] + 0.3 * rng.normal(size=(n, dim))
+    x = x.astype(np.float32)
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+
+def _recall_at_10(index, vectors, queries, nprobe):
+    hits = 0
+    for q in queries:
+        exact = set(np.argsort(-(vectors @ q))[:10])
+        cand = index.candidates(q, nprobe)
+        approx = set(cand[np.argsort(-(vectors[cand] @ q))[:10]])
+        hits += len(exact & approx)
+    return hits / (10 * len(queries))
+
+
+def test_every_vector_lands_in_exactly_one_cell():
+    """The CSR lists partition the ids."""
+    vectors = _clustered_vectors()
+    index = IVFIndex.build(vectors, nlist=50)
+    assert index.nlist == 50
+    assert index.offsets[-1] == len(vectors)
+    assert sorted(index.ids.tolist()) == list(range(len(vectors)))
+
+
+def test_nprobe_trades_speed_for_recall():
+    """Probing all cells is exact; a handful of cells already gives high recall."""
+    vectors = _clustered_vectors()
+    queries = _clustered_vectors(n=50, seed=2)
+    index = IVFIndex.build(vectors, nlist=64)
+
+    assert _recall_at_10(index, vectors, queries, nprobe=64) == 1.0
+    assert _recall_at_10(index, vectors, queries, nprobe=8) >= 0.9
+    assert len(index.candidates(queries[0], 4)) < len(vectors) / 4
+
+
+def test_save_and_load_roundtrip(tmp_path):
+    """A persisted index answers identically after loading."""
+    vectors = _clustered_vectors(n=500)
+    index = IVFIndex.build(vectors, nlist=10, fingerprint="abc")
+    path = str(tmp_path / "ann.npz")
+    index.save(path)
+
+    loaded = IVFIndex.load(path)
+    assert loaded.fingerprint == "abc"
+    np.testing.assert_array_equal(loaded.candidates(vectors[0], 3), index.candidates(vectors[0], 3))
+
+
+def test_kb_service_uses_persisted_ann_index(tmp_path, monkeypatch):
+    """Above KB_ANN_MIN_ITEMS the KB builds an IVF index once and reuses it from disk."""
+    from app.services import kb_service as kb_module
+    from app.services.embedding_provider import LocalHashingEmbeddingProvider
+
+    monkeypatch.setattr(kb_module.settings, "KB_ANN_MIN_ITEMS", 1)
+    monkeypatch.setattr(kb_module.settings, "KB_ANN_NPROBE", 10_000)
+    provider = LocalHashingEmbeddingProvider(dim=128)
+
+    kb = kb_module.KBService(cache_dir=str(tmp_path), provider=provider)
+    assert kb.snapshot.ann is not None
+    assert len(list(tmp_path.glob("ann-*.npz"))) == 1
+
+    q = provider.embed(["refund policy"])[0]
+    exact = kb.snapshot.embeddings @ q
+    approx = kb.snapshot.dense_scores(q)
+    assert list(approx[kb_module._top_k_indices(approx, 3)]) == sorted(exact, reverse=True)[:3]
+
+    again = kb_module.KBService(cache_dir=str(tmp_path), provider=provider)
+    assert again.snapshot.ann.fingerprint == kb.snapshot.ann.fingerprint
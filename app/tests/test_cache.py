@@ -0,0 +1,51 @@
+# File: app/tests/test_cache.py
+
+from app.services.cache import TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_entries_expire_after_ttl():
+    """An entry is served until its TTL passes, then counts as a miss."""
+    clock = FakeClock()
+    cache = TTLCache(maxsize=4, ttl=10, clock=clock)
+    cache.set("q", 1)
+
+    clock.now = 9.9
+    assert cache.get("q") == 1
+    clock.now = 10.0
+    assert cache.get("q") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    """Reading an entry protects it from eviction."""
+    cache = TTLCache(maxsize=2, ttl=None)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert len(cache) == 2
+
+
+def test_remove_where_drops_matching_keys():
+    """Entries are dropped by key predicate, e.g. every lookup for one email."""
+    cache = TTLCache(maxsize=4, ttl=None)
+    cache.set(("shopify", "a"), 1)
+    cache.set(("shopify", "b"), 2)
+    cache.set(("clickbank", "a"), 3)
+
+    assert cache.remove_where(lambda key: key[1] == "a") == 2
+    assert cache.get(("shopify", "b")) == 2
+    assert len(cache) == 1
@@ -0,0 +1,41 @@
+# File: app/tests/test_chunking.py
+
+from app.models.schemas import KBItem
+from app.services.chunking import chunk_item, split_passages
+
+POLICY = " ".join(
+    f"Sentence number {i} of the shipping policy explains one more detail." for i in range(1, 31)
+)
+
+
+def test_short_items_are_not_split():
+    """Items under the limit are indexed whole, with no parent pointer."""
+    item = KBItem(id="faq_1", type="faq", title="Short", answer="Ships in 3-5 days.")
+    assert chunk_item(item, max_chars=600, overlap_chars=120) == [item]
+
+
+def test_passages_respect_size_and_overlap():
+    """Every passage fits the limit and repeats the tail of the previous one."""
+    passages = split_passages(POLICY, max_chars=300, overlap_chars=80)
+    assert len(passages) > 1
+    assert all(len(p) <= 300 for p in passages)
+    for prev, nxt in zip(passages, passages[1:]):
+        last_sentence = prev.rsplit(". ", 1)[-1]
+        assert nxt.startswith(last_sentence)
+
+
+def test_unpunctuated_text_is_cut_on_words():
+    """Scraped text without sentence breaks is still bounded."""
+    text = "word " * 400
+    passages = split_passages(text.strip(), max_chars=200, overlap_chars=0)
+    assert all(len(p) <= 200 for p in passages)
+    assert " ".join(passages).split() == text.split()
+
+
+def test_passages_point_back_to_parent():
+    """Passages keep the parent's metadata and reference its id."""
+    item = KBItem(id="policy_ship", type="policy", title="Shipping Policy", answer=POLICY, tags=["shipping"])
+    chunks = chunk_item(item, max_chars=300, overlap_chars=80)
+    assert [c.id for c in chunks] == [f"policy_ship#p{n}" for n in range(1, len(chunks) + 1)]
+    assert all(c.parent_id == "policy_ship" and c.tags == ["shipping"] for c in chunks)
+    assert all(c.title == "Shipping Policy" for c in chunks)
@@ -0,0 +1,82 @@
+# File: app/tests/test_circuit_breaker.py
+
+import asyncio
+
+import pytest
+
+from app.services.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+
+async def ok():
+    return "ok"
+
+
+async def boom():
+    raise ConnectionError("provider down")
+
+
+def run(breaker, fn):
+    return asyncio.run(breaker.call(fn))
+
+
+def test_opens_after_consecutive_failures_and_fails_fast():
+    breaker = CircuitBreaker("test", failure_threshold=3)
+    for _ in range(3):
+        with pytest.raises(ConnectionError):
+            run(breaker, boom)
+    assert breaker.state == OPEN
+
+    called = []
+
+    async def tracked():
+        called.append(1)
+        return "ok"
+
+    with pytest.raises(CircuitOpenError):
+        run(breaker, tracked)
+    assert called == []
+    assert breaker.stats()["rejected"] == 1
+
+
+def test_deadline_counts_as_failure():
+    """A call slower than the deadline is cut off and recorded as a failure."""
+    breaker = CircuitBreaker("test", deadline=0.05, failure_threshold=1)
+
+    async def slow():
+        await asyncio.sleep(1)
+
+    with pytest.raises(asyncio.TimeoutError):
+        run(breaker, slow)
+    assert breaker.state == OPEN
+
+
+def test_half_open_probe_closes_or_reopens():
+    """After the recovery timeout one probe decides whether the circuit closes."""
+    now = [0.0]
+    breaker = CircuitBreaker("test", failure_threshold=1, recovery_timeout=30, clock=lambda: now[0])
+    with pytest.raises(ConnectionError):
+        run(breaker, boom)
+
+    now[0] = 31.0
+    with pytest.raises(ConnectionError):
+        run(breaker, boom)
+    assert breaker.state == OPEN and breaker.times_opened == 2
+
+    now[0] = 62.0
+    assert breaker.allow() and breaker.state == HALF_OPEN
+    assert not breaker.allow()  # only one probe at a time
+    breaker.record_success(0.1)
+    assert breaker.state == CLOSED
+    assert run(breaker, ok) == "ok"
+
+
+def test_error_rate_over_window_opens_the_circuit():
+    """Alternating failures never hit the consecutive limit but trip the rate."""
+    breaker = CircuitBreaker("test", failure_threshold=10, error_rate=0.5, window=10, min_calls=10)
+    for i in range(10):
+        if i % 2:
+            with pytest.raises(ConnectionError):
+                run(breaker, boom)
+        else:
+            run(breaker, ok)
+    assert breaker.state == OPEN
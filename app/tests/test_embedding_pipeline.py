@@ -0,0 +1,61 @@
+# File: app/tests/test_embedding_pipeline.py
+
+import threading
+
+import numpy as np
+
+from app.services.embedding_pipeline import bulk_embed, make_batches
+
+
+def _embed(texts):
+    return np.array([[len(t), 1.0] for t in texts], dtype=np.float32)
+
+
+def test_batches_respect_item_and_token_limits():
+    """No batch exceeds the item count or the estimated token budget."""
+    texts = ["x" * 40] * 10  # ~11 tokens each
+    batches = make_batches(texts, max_items=4, max_tokens=30)
+    assert batches == [(0, 2), (2, 4), (4, 6), (6, 8), (8, 10)]
+
+    assert make_batches(["x" * 400], max_items=4, max_tokens=30) == [(0, 1)]
+
+
+def test_bulk_embed_retries_transient_failures():
+    """A batch that fails once is retried and succeeds."""
+    attempts = []
+
+    def flaky(texts):
+        attempts.append(len(texts))
+        if len(attempts) == 1:
+            raise TimeoutError("transient")
+        return _embed(texts)
+
+    result = bulk_embed(["a", "bb", "ccc"], flaky, max_retries=2, backoff=0)
+    assert result.failed == []
+    np.testing.assert_array_equal(result.vectors[:, 0], [1, 2, 3])
+    assert len(attempts) == 2
+
+
+def test_partial_failure_keeps_successful_batches():
+    """A permanently failing batch only loses its own rows."""
+    lock = threading.Lock()
+    progress = []
+
+    def half_broken(texts):
+        if "bad" in texts:
+            raise RuntimeError("boom")
+        return _embed(texts)
+
+    def on_progress(done, total):
+        with lock:
+            progress.append((done, total))
+
+    texts = ["ok1", "ok2", "bad", "ok3"]
+    result = bulk_embed(
+        texts, half_broken, max_batch_items=2, concurrency=2, max_retries=1, backoff=0,
+        progress=on_progress,
+    )
+    assert result.failed == [2, 3]
+    assert result.succeeded == [0, 1]
+    np.testing.assert_array_equal(result.vectors[2:], 0)
+    assert sorted(progress)[-1] == (4, 4)
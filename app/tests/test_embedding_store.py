@@ -0,0 +1,68 @@
+# File: app/tests/test_embedding_store.py
+
+import numpy as np
+
+from app.services.embedding_store import EmbeddingStore
+
+
+def test_store_roundtrip_is_memory_mapped(tmp_path):
+    """Vectors written by one store instance load memory-mapped in the next."""
+    store = EmbeddingStore(str(tmp_path), "test-model")
+    vectors = np.arange(6, dtype=np.float32).reshape(2, 3)
+    store.put(["alpha", "beta"], vectors)
+
+    reopened = EmbeddingStore(str(tmp_path), "test-model")
+    assert isinstance(reopened._matrix, np.memmap)
+
+    fetched, missing = reopened.fetch(["beta", "gamma", "alpha"])
+    assert missing == [1]
+    assert fetched.dtype == np.float32
+    np.testing.assert_array_equal(fetched[0], vectors[1])
+    np.testing.assert_array_equal(fetched[1], np.zeros(3))
+    np.testing.assert_array_equal(fetched[2], vectors[0])
+
+
+def test_store_keys_include_model_name(tmp_path):
+    """The same text embedded by another model is a cache miss."""
+    EmbeddingStore(str(tmp_path), "model-a").put(["alpha"], np.ones((1, 2)))
+
+    fetched, missing = EmbeddingStore(str(tmp_path), "model-b").fetch(["alpha"])
+    assert fetched is None
+    assert missing == [0]
+
+
+def test_store_appends_only_new_texts(tmp_path):
+    """Re-putting a known text does not grow the matrix."""
+    store = EmbeddingStore(str(tmp_path), "test-model")
+    store.put(["alpha"], np.ones((1, 2)))
+    store.put(["alpha", "beta"], np.full((2, 2), 2.0))
+
+    assert len(store) == 2
+    fetched, missing = store.fetch(["alpha", "beta"])
+    assert missing == []
+    np.testing.assert_array_equal(fetched, [[1.0, 1.0], [2.0, 2.0]])
+    assert len(list(tmp_path.glob("*.npy"))) == 1
+
+
+def test_kb_service_embeds_only_uncached_items(tmp_path):
+    """A second KBService start sends nothing to the embedding backend."""
+    from app.services import kb_service as kb_module
+    from app.services.embedding_provider import EmbeddingProvider
+
+    class CountingProvider(EmbeddingProvider):
+        model_name = "test-ones"
+
+        def __init__(self):
+            self.calls = []
+
+        def embed(self, texts):
+            self.calls.append(list(texts))
+            return np.ones((len(texts), 4), dtype=np.float32)
+
+    provider = CountingProvider()
+    first = kb_module.KBService(cache_dir=str(tmp_path), provider=provider)
+    assert len(provider.calls) == 1 and len(provider.calls[0]) == len(first.items)
+
+    second = kb_module.KBService(cache_dir=str(tmp_path), provider=provider)
+    assert len(provider.calls) == 1
+    assert second.embeddings.shape == (len(second.items), 4)
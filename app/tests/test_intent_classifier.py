@@ -0,0 +1,47 @@
+# File: app/tests/test_intent_classifier.py
+
+import numpy as np
+
+from app.services.intent_classifier import IntentClassifier
+
+
+def one_hot(*rows, dim=4):
+    out = np.zeros((len(rows), dim), dtype=np.float32)
+    for i, col in enumerate(rows):
+        out[i, col] = 1.0
+    return out
+
+
+EXAMPLES = {"usage": ["u1", "u2"], "subscription": ["s1"], "general": ["g1"]}
+AXIS = {"u1": 0, "u2": 0, "s1": 1, "g1": 2}
+
+
+def build(**kwargs):
+    return IntentClassifier.build(lambda texts: one_hot(*(AXIS[t] for t in texts)), EXAMPLES, **kwargs)
+
+
+def test_centroids_are_unit_means_of_the_examples():
+    clf = build()
+    assert clf.intents == ["usage", "subscription", "general"]
+    np.testing.assert_allclose(np.linalg.norm(clf.centroids, axis=1), 1.0, rtol=1e-6)
+
+
+def test_embedding_overrides_a_keyword_misfire():
+    """'auto' made the keywords say subscription; the vector clearly says usage."""
+    clf = build()
+    intent, confidence, source = clf.classify(np.array([1, 0, 0, 0], dtype=np.float32), "subscription")
+    assert (intent, source) == ("usage", "embedding")
+    assert confidence > 0.9
+
+
+def test_keyword_intent_is_kept_when_the_embedding_agrees():
+    clf = build(keyword_margin=0.1)
+    q = np.array([0.7, 0.7, 0, 0], dtype=np.float32) / np.sqrt(0.98)
+    intent, _, source = clf.classify(q, "subscription")
+    assert (intent, source) == ("subscription", "keywords+embedding")
+
+
+def test_weak_similarity_falls_back_to_keywords():
+    clf = build(min_similarity=0.5)
+    assert clf.classify(np.array([0, 0, 0, 1], dtype=np.float32), "general")[::2] == ("general", "keywords")
+    assert clf.classify(None, "refund") == ("refund", None, "keywords")
@@ -0,0 +1,297 @@
+# File: app/tests/test_kb_service.py
+
+import numpy as np
+import pytest
+
+from app.services import kb_service as kb_module
+from app.services.embedding_provider import EmbeddingProvider, LocalHashingEmbeddingProvider
+
+
+def _fake_embed(texts):
+    """Deterministic bag-of-letters vectors so tests never touch the network."""
+    out = np.zeros((len(texts), 26), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for ch in text.lower():
+            if "a" <= ch <= "z":
+                out[row, ord(ch) - ord("a")] += 1.0
+    return out
+
+
+class LetterProvider(EmbeddingProvider):
+    model_name = "test-letters"
+
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.calls = []
+
+    def embed(self, texts):
+        self.calls.append(list(texts))
+        if self.fail:
+            raise ConnectionError("offline")
+        return _fake_embed(texts)
+
+
+@pytest.fixture
+def kb(tmp_path):
+    return kb_module.KBService(cache_dir=str(tmp_path), provider=LetterProvider())
+
+
+def test_embeddings_are_unit_float32(kb):
+    """The index holds pre-normalized float32 rows."""
+    assert kb.embeddings.dtype == np.float32
+    np.testing.assert_allclose(np.linalg.norm(kb.embeddings, axis=1), 1.0, rtol=1e-5)
+
+
+def test_search_matches_full_sort(kb):
+    """argpartition top-k returns the same ranking as a full cosine argsort."""
+    query = "How long does shipping take?"
+    q = _fake_embed([query])[0].astype(np.float64)
+    raw = np.array([_fake_embed([kb._item_to_text(i)])[0] for i in kb.items], dtype=np.float64)
+    expected = raw @ q / (np.linalg.norm(raw, axis=1) * np.linalg.norm(q))
+
+    scores = kb.snapshot.dense_scores(kb_module._normalize_rows(q))
+    top = kb_module._top_k_indices(scores, 5)
+    assert len(top) == 5
+    np.testing.assert_allclose(scores[top], np.sort(expected)[::-1][:5], rtol=1e-5)
+
+
+def test_search_many_equals_individual_searches(kb):
+    """Batch scoring gives the same answers as one query at a time."""
+    queries = ["refund policy", "side effects", "price"]
+    batched = kb.search_many(queries, top_k=3)
+    assert len(batched) == 3
+    for query, results in zip(queries, batched):
+        single = kb.search(query, top_k=3)
+        assert [s for _, s in results] == pytest.approx([s for _, s in single])
+
+
+def test_search_top_k_larger_than_kb(kb):
+    """Asking for more items than exist returns every item, sorted."""
+    scores = kb.snapshot.dense_scores(kb_module._normalize_rows(_fake_embed(["anything"])[0]))
+    top = kb_module._top_k_indices(scores, len(kb.items) + 10)
+    assert len(top) == len(kb.items)
+    assert list(scores[top]) == sorted(scores, reverse=True)
+
+
+def test_repeated_queries_hit_embedding_cache(kb):
+    """Variants of the same question are embedded once."""
+    kb.provider.calls.clear()
+
+    kb.search("Where is my order?")
+    kb.search("  where IS my order ")
+    kb.search_many(["Where is my order", "refund policy"])
+
+    assert kb.provider.calls == [["where is my order"], ["refund policy"]]
+    stats = kb.query_cache.stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 2
+
+
+def test_query_embedding_retries_a_transient_failure(kb, monkeypatch):
+    """One failed embeddings call does not drop the customer's query to keyword search."""
+    monkeypatch.setattr(kb_module.settings, "QUERY_EMBEDDING_RETRY_BACKOFF", 0.0)
+    embed = kb.provider.embed
+    failures = [ConnectionError("429")]
+
+    def flaky(texts):
+        if failures:
+            raise failures.pop()
+        return embed(texts)
+
+    monkeypatch.setattr(kb.provider, "embed", flaky)
+    assert kb.query_vector("Do you ship to Canada?") is not None
+
+
+def test_keyword_search_without_embeddings(tmp_path, monkeypatch):
+    """If the embeddings API is down, BM25 still answers from the local index."""
+    monkeypatch.setattr(kb_module.settings, "EMBEDDING_MAX_RETRIES", 0)
+    kb = kb_module.KBService(cache_dir=str(tmp_path), provider=LetterProvider(fail=True))
+    assert kb.embeddings is None
+
+    results = kb.search("What is your refund policy?", top_k=3)
+    assert results
+    assert "refund" in results[0][0].title.lower()
+    assert 0 < results[0][1] <= 1
+
+
+def test_hybrid_search_fuses_dense_and_keyword(kb):
+    """Fused results report cosine scores and include the strong keyword match."""
+    results = kb.search("wholesale bulk orders", top_k=5)
+    dense_scores = kb.embeddings @ kb.embed_query("wholesale bulk orders")
+
+    assert any("bulk" in item.title.lower() for item, _ in results)
+    for item, score in results:
+        assert score == pytest.approx(float(dense_scores[kb.items.index(item)]), abs=1e-6)
+
+
+def test_reload_reembeds_only_changed_items(tmp_path):
+    """Editing one KB file re-embeds only the edited item and swaps snapshots."""
+    import json
+    import shutil
+
+    data_dir = tmp_path / "data"
+    shutil.copytree(kb_module.KB_DATA_DIR, data_dir)
+    provider = LetterProvider()
+    kb = kb_module.KBService(
+        data_dir=str(data_dir), cache_dir=str(tmp_path / "cache"), provider=provider
+    )
+    old_snapshot, old_version = kb.snapshot, kb.version
+
+    assert kb.reload()["reloaded"] is False
+
+    path = data_dir / "faqs.json"
+    faqs = json.loads(path.read_text(encoding="utf-8"))
+    faqs[0]["answer"] = "Refunds are issued within 90 days of purchase."
+    path.write_text(json.dumps(faqs), encoding="utf-8")
+
+    provider.calls.clear()
+    result = kb.reload()
+    assert result["reloaded"] is True
+    assert result["changed_files"] == ["faqs.json"]
+    assert result["embedded"] == 1
+    assert len(provider.calls) == 1 and "90 days" in provider.calls[0][0]
+    assert kb.version != old_version
+    assert kb.snapshot is not old_snapshot
+    assert any("90 days" in item.answer for item in kb.items)
+    assert not any("90 days" in item.answer for item in old_snapshot.items)
+
+
+def test_reload_retries_embeddings_that_failed(tmp_path, monkeypatch):
+    """A KB that came up keyword-only gets its vectors once the provider recovers."""
+    monkeypatch.setattr(kb_module.settings, "EMBEDDING_MAX_RETRIES", 0)
+    provider = LetterProvider(fail=True)
+    kb = kb_module.KBService(cache_dir=str(tmp_path), provider=provider)
+    assert kb.embeddings is None
+    assert kb.snapshot.missing_embeddings == len(kb.passages)
+
+    provider.fail = False
+    result = kb.reload()
+    assert result["reloaded"] is True and result["changed_files"] == []
+    assert result["embedded"] == len(kb.passages)
+    assert kb.snapshot.missing_embeddings == 0
+    assert kb.reload()["reloaded"] is False
+
+
+def test_local_provider_is_deterministic_and_offline(tmp_path):
+    """The hashed n-gram backend ranks sensibly with no network access."""
+    provider = LocalHashingEmbeddingProvider(dim=256)
+    a = provider.embed(["How long does shipping take?"])
+    b = LocalHashingEmbeddingProvider(dim=256).embed(["How long does shipping take?"])
+    np.testing.assert_array_equal(a, b)
+    assert a.shape == (1, 256) and a.dtype == np.float32
+
+    kb = kb_module.KBService(cache_dir=str(tmp_path), provider=provider)
+    top_item, top_score = kb.search("refund policy", top_k=1)[0]
+    assert "refund" in top_item.title.lower()
+    assert 0 < top_score <= 1
+
+
+def test_long_items_are_indexed_as_passages(tmp_path, monkeypatch):
+    """Passages are searched individually and collapsed to one per parent by default."""
+    import json
+
+    monkeypatch.setattr(kb_module.settings, "KB_CHUNK_MAX_CHARS", 200)
+    monkeypatch.setattr(kb_module.settings, "KB_CHUNK_OVERLAP_CHARS", 40)
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    answer = (
+        "Orders ship from our warehouse within one business day. "
+        "Domestic delivery takes three to five business days. "
+        "International customers should allow ten to fifteen business days. "
+        "Customs duties are paid by the recipient on arrival. "
+        "Refunds for lost parcels are issued once the carrier confirms the loss."
+    )
+    (data_dir / "faqs.json").write_text(json.dumps([
+        {"id": "policy_ship", "type": "policy", "title": "Shipping Policy", "answer": answer},
+    ]))
+
+    kb = kb_module.KBService(
+        data_dir=str(data_dir), cache_dir=str(tmp_path / "cache"),
+        provider=LocalHashingEmbeddingProvider(dim=256),
+    )
+    assert len(kb.items) == 1
+    assert len(kb.passages) > 1
+
+    all_hits = kb.search("who pays customs duties on arrival", top_k=5, collapse=False)
+    assert len(all_hits) == len(kb.passages)
+    assert "Customs" in all_hits[0][0].answer
+
+    collapsed = kb.search("who pays customs duties on arrival", top_k=5)
+    assert len(collapsed) == 1
+    assert collapsed[0][0].id == all_hits[0][0].id
+    assert kb.parent_of(collapsed[0][0]).answer == answer
+
+
+def test_parent_of_resolves_duplicate_ids_by_row(tmp_path, monkeypatch):
+    """Two long items sharing an ID each map their passages back to their own parent."""
+    import json
+
+    monkeypatch.setattr(kb_module.settings, "KB_CHUNK_MAX_CHARS", 120)
+    monkeypatch.setattr(kb_module.settings, "KB_CHUNK_OVERLAP_CHARS", 20)
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    short = "Refunds are issued within thirty days of purchase. Contact support to start a return request."
+    detailed = (
+        "Unopened bottles can be returned for a full refund within ninety days. "
+        "Opened bottles qualify under our satisfaction guarantee. "
+        "Return shipping labels are emailed once the request is approved."
+    )
+    for name, answer in (("complete_kb.json", short), ("faqs_comprehensive.json", detailed)):
+        (data_dir / name).write_text(json.dumps([
+            {"id": "faq_refund_policy", "type": "faq", "title": "Refund Policy", "answer": answer},
+        ]))
+
+    kb = kb_module.KBService(
+        data_dir=str(data_dir), cache_dir=str(tmp_path / "cache"),
+        provider=LocalHashingEmbeddingProvider(dim=256),
+    )
+    hits = kb.search("return shipping labels emailed once approved", top_k=5, collapse=False)
+    assert "labels" in hits[0][0].answer
+    assert kb.parent_of(hits[0][0]).answer == detailed
+    assert {kb.parent_of(p).answer for p, _ in hits} == {short, detailed}
+
+
+def test_retrieve_blocks_follow_the_matched_item_when_ids_repeat(tmp_path):
+    """Each retrieved item brings its own prompt block, even if another file reuses its ID."""
+    import json
+
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    (data_dir / "complete_kb.json").write_text(json.dumps([
+        {"id": "faq_shipping_time", "type": "faq", "title": "Shipping", "answer": "Ships fast."},
+    ]))
+    (data_dir / "faqs_comprehensive.json").write_text(json.dumps([
+        {"id": "faq_shipping_time", "type": "faq", "title": "Shipping Time",
+         "answer": "Domestic orders arrive in three to five business days; international in ten to fifteen."},
+    ]))
+
+    kb = kb_module.KBService(
+        data_dir=str(data_dir), cache_dir=str(tmp_path / "cache"),
+        provider=LocalHashingEmbeddingProvider(dim=256),
+    )
+    result = kb.retrieve("how many business days for international orders", top_k=2)
+    assert len(result.results) == 2
+    for (item, _), (text, _) in zip(result.results, result.blocks):
+        assert text == kb_module.format_kb_block(item)
+
+
+def test_tag_and_type_filters_apply_before_scoring(kb):
+    """Filtered searches only return passages carrying the requested metadata."""
+    results = kb.search("how much does it cost", top_k=10, tags=["refund"])
+    assert results
+    assert all("refund" in [t.lower() for t in item.tags] for item, _ in results)
+
+    products = kb.search("how much does it cost", top_k=10, types=["product"], tags=["dosage"])
+    assert all(item.type == "product" and "dosage" in item.tags for item, _ in products)
+
+    assert kb.search("anything", tags=["no-such-tag"]) == []
+
+
+def test_retrieve_falls_back_to_unfiltered_search(kb):
+    """A filter that matches nothing does not leave the request without KB context."""
+    result = kb.retrieve("What is HardChews?", tags=["no-such-tag"])
+    assert result.results
+    assert result.filtered is False
+
+    narrowed = kb.retrieve("What is your refund policy?", tags=["refund"])
+    assert narrowed.filtered is True
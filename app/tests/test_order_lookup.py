@@ -0,0 +1,87 @@
+# File: app/tests/test_order_lookup.py
+
+import asyncio
+import time
+
+from app.services.order_lookup import OrderLookup, OrderProvider
+
+
+def make_provider(name, order=None, delay=0.0, calls=None):
+    def find(email, number):
+        if calls is not None:
+            calls.append(name)
+        time.sleep(delay)
+        return order
+
+    return OrderProvider(name, name.upper(), find, lambda o: f"{name} order {o['id']}")
+
+
+def test_first_match_wins_and_cancels_the_slower_lookup():
+    """A fast match returns without waiting for the slow provider."""
+    lookup = OrderLookup([
+        make_provider("slow", order=None, delay=0.5),
+        make_provider("fast", order={"id": 7}, delay=0.01),
+    ])
+
+    async def timed_find():
+        start = time.perf_counter()
+        result = await lookup.find("a@example.com", "7")
+        return time.perf_counter() - start, result
+
+    elapsed, (match, outcomes) = asyncio.run(timed_find())
+
+    assert elapsed < 0.4
+    assert match.provider.name == "fast"
+    assert "fast order 7" in match.context()
+    assert outcomes["fast"]["outcome"] == "found"
+    assert outcomes["slow"]["outcome"] == "cancelled"
+    assert lookup.stats()["providers"]["slow"]["cancelled"] == 1
+
+
+def test_no_match_waits_for_the_slower_provider_not_the_sum():
+    """Both providers miss: total time is about the slower one, not both added up."""
+    lookup = OrderLookup([
+        make_provider("shopify", delay=0.2),
+        make_provider("clickbank", delay=0.2),
+    ])
+
+    start = time.perf_counter()
+    match, outcomes = asyncio.run(lookup.find("b@example.com", None))
+
+    assert match is None
+    assert time.perf_counter() - start < 0.35
+    assert {o["outcome"] for o in outcomes.values()} == {"not_found"}
+    assert lookup.stats()["providers"]["shopify"]["not_found"] == 1
+    assert lookup.stats()["providers"]["shopify"]["latency_p50_ms"] >= 150
+
+
+def test_follow_up_lookups_are_served_from_the_cache():
+    """Found and not-found results are cached; a follow-up makes no provider calls."""
+    calls = []
+    lookup = OrderLookup([
+        make_provider("shopify", calls=calls),
+        make_provider("clickbank", order={"id": 3}, calls=calls),
+    ])
+
+    asyncio.run(lookup.find("C@example.com", "3"))
+    match, outcomes = asyncio.run(lookup.find("c@example.com ", "3"))
+
+    assert sorted(calls) == ["clickbank", "shopify"]
+    assert match.provider.name == "clickbank"
+    assert outcomes["shopify"] == {"outcome": "not_found", "cached": True}
+    assert outcomes["clickbank"] == {"outcome": "found", "cached": True}
+    assert lookup.stats()["cache"]["hits"] == 2
+
+
+def test_invalidate_drops_one_providers_entries_for_an_email():
+    """A Shopify webhook forgets that customer's Shopify results only."""
+    calls = []
+    lookup = OrderLookup([make_provider("shopify", calls=calls), make_provider("clickbank", calls=calls)])
+    asyncio.run(lookup.find("d@example.com", "1"))
+    asyncio.run(lookup.find("d@example.com", "2"))
+
+    assert lookup.invalidate("shopify", "D@example.com") == 2
+
+    calls.clear()
+    asyncio.run(lookup.find("d@example.com", "1"))
+    assert calls == ["shopify"]
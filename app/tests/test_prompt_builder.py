@@ -0,0 +1,41 @@
+# File: app/tests/test_prompt_builder.py
+
+from app.services.prompt_builder import assemble_messages
+from app.services.tokens import count_tokens
+
+
+def block(text):
+    return text, count_tokens(text)
+
+
+def test_lowest_scoring_blocks_are_dropped_to_fit_the_budget():
+    """Blocks are ranked best first; the tail goes when the budget is tight."""
+    blocks = [block("best " * 40), block("middle " * 40), block("worst " * 40)]
+    messages, stats = assemble_messages("system", "question?", blocks, budget=150)
+
+    user = messages[-1]["content"]
+    assert "best" in user and "worst" not in user
+    assert stats["kb_blocks_dropped"] >= 1
+    assert stats["prompt_tokens"] <= 150
+
+
+def test_recent_history_is_kept_in_order_within_its_share():
+    """The newest turns survive a tight history budget and keep their order."""
+    history = [{"role": "user" if i % 2 == 0 else "assistant", "content": f"turn {i} " * 10} for i in range(6)]
+    messages, stats = assemble_messages(
+        "system", "and now?", [], history=history, budget=1000, history_max_tokens=60,
+    )
+
+    kept = [m["content"] for m in messages[1:-1]]
+    assert kept == [h["content"] for h in history[-stats["history_messages"]:]]
+    assert 0 < stats["history_messages"] < len(history)
+    assert messages[0]["role"] == "system" and messages[-1]["role"] == "user"
+
+
+def test_order_context_is_always_sent():
+    """Extra context such as an order status is never dropped for budget."""
+    messages, stats = assemble_messages(
+        "system", "where is it?", [block("faq " * 200)], extra_context="\n\n[ORDER STATUS] shipped", budget=50,
+    )
+    assert "[ORDER STATUS] shipped" in messages[-1]["content"]
+    assert stats["kb_blocks"] == 0
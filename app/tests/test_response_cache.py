@@ -0,0 +1,52 @@
+# File: app/tests/test_response_cache.py
+
+import numpy as np
+
+from app.services.response_cache import SemanticResponseCache
+
+
+def unit(*values):
+    v = np.array(values, dtype=np.float32)
+    return v / np.linalg.norm(v)
+
+
+def test_similar_question_hits_and_dissimilar_misses():
+    """A paraphrase above the threshold reuses the reply; another topic does not."""
+    cache = SemanticResponseCache(maxsize=4, threshold=0.9)
+    cache.put(unit(1, 0, 0), "refund", "v1", "refund policy?", "30 days.")
+
+    assert cache.get(unit(1, 0.1, 0), "refund", "v1") == "30 days."
+    assert cache.get(unit(0, 1, 0), "refund", "v1") is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_intent_and_kb_version_are_part_of_the_key():
+    """The same question under another intent or KB version is a miss."""
+    cache = SemanticResponseCache(maxsize=4, threshold=0.9)
+    cache.put(unit(1, 0), "refund", "v1", "q", "old answer")
+
+    assert cache.get(unit(1, 0), "shipping", "v1") is None
+    assert cache.get(unit(1, 0), "refund", "v2") is None
+
+
+def test_least_recently_used_entry_is_evicted():
+    """When full, the entry that was read least recently goes first."""
+    cache = SemanticResponseCache(maxsize=2, threshold=0.99)
+    cache.put(unit(1, 0, 0), "general", "v1", "a", "A")
+    cache.put(unit(0, 1, 0), "general", "v1", "b", "B")
+    assert cache.get(unit(1, 0, 0), "general", "v1") == "A"
+
+    cache.put(unit(0, 0, 1), "general", "v1", "c", "C")
+
+    assert len(cache) == 2
+    assert cache.get(unit(0, 1, 0), "general", "v1") is None
+    assert cache.get(unit(1, 0, 0), "general", "v1") == "A"
+
+
+def test_entries_expire_after_ttl():
+    now = [0.0]
+    cache = SemanticResponseCache(maxsize=2, threshold=0.9, ttl=10, clock=lambda: now[0])
+    cache.put(unit(1, 0), "general", "v1", "q", "A")
+
+    now[0] = 11.0
+    assert cache.get(unit(1, 0), "general", "v1") is None
@@ -0,0 +1,332 @@
+# File: app/tests/test_router.py
+
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.models.schemas import ChatwootIncomingMessage, ChatwootConversation, ChatwootContact
+from app.services import kb_service as kb_module
+from app.services import router_service
+from app.services.embedding_provider import LocalHashingEmbeddingProvider
+
+
+class CountingProvider(LocalHashingEmbeddingProvider):
+    def __init__(self):
+        super().__init__(dim=256)
+        self.calls = []
+
+    def embed(self, texts):
+        self.calls.append(list(texts))
+        return super().embed(texts)
+
+
+def create_test_payload(content: str, conversation_id: int = 9001) -> ChatwootIncomingMessage:
+    return ChatwootIncomingMessage(
+        content=content,
+        conversation=ChatwootConversation(id=conversation_id, account_id=1),
+        contact=ChatwootContact(email=None, name="Test Customer"),
+        message_type="incoming",
+        private=False,
+    )
+
+
+@pytest.fixture
+def offline_kb(tmp_path, monkeypatch):
+    """Route the router and fallback service to an offline KB with a call counter."""
+    provider = CountingProvider()
+    kb = kb_module.KBService(cache_dir=str(tmp_path), provider=provider)
+    monkeypatch.setattr(kb_module, "_kb_service", kb)
+    router_service.intent_classifier()  # built at startup in the app
+    provider.calls.clear()
+    return kb
+
+
+def test_fallback_reuses_the_request_retrieval(offline_kb, monkeypatch):
+    """When generation fails, the KB fallback answers without a second query embedding."""
+    async def failing_generate(**kwargs):
+        raise TimeoutError("provider down")
+
+    monkeypatch.setattr(router_service, "generate_reply", failing_generate)
+
+    reply = asyncio.run(router_service.handle_message(create_test_payload("Can I get a refund on opened bottles?")))
+
+    assert offline_kb.provider.calls == [["can i get a refund on opened bottles"]]
+    assert reply.content
+    assert reply.debug_info["kb_matches"]
+
+
+def test_repeated_faq_is_answered_from_the_response_cache(offline_kb, monkeypatch):
+    """A second identical FAQ skips generation; order-status turns are never cached."""
+    from app.services.response_cache import SemanticResponseCache
+
+    calls = []
+
+    async def fake_generate(**kwargs):
+        calls.append(kwargs["user_message"])
+        return f"answer {len(calls)}"
+
+    monkeypatch.setattr(router_service, "generate_reply", fake_generate)
+    monkeypatch.setattr(router_service, "get_response_cache", lambda c=SemanticResponseCache(): c)
+
+    first = asyncio.run(router_service.handle_message(create_test_payload("What is your refund policy?", 9010)))
+    second = asyncio.run(router_service.handle_message(create_test_payload("What is your refund policy?", 9011)))
+    assert second.content == first.content == "answer 1"
+    assert second.debug_info["response_cache"] == "hit"
+
+    asyncio.run(router_service.handle_message(create_test_payload("Where is my order? jane@example.com", 9012)))
+    asyncio.run(router_service.handle_message(create_test_payload("Where is my order? jane@example.com", 9013)))
+    assert len(calls) == 3
+
+
+def test_follow_up_replies_are_not_shared_across_conversations(offline_kb, monkeypatch):
+    """A reply generated from one customer's history never answers another customer."""
+    from app.services.order_lookup import OrderLookup, OrderProvider
+    from app.services.response_cache import SemanticResponseCache
+
+    lookup = OrderLookup([OrderProvider("shopify", "SHOPIFY", lambda email, number: None, str)])
+    monkeypatch.setattr(router_service, "get_order_lookup", lambda: lookup)
+
+    async def history_generate(**kwargs):
+        earlier = " / ".join(m["content"] for m in kwargs["history"])
+        return f"Re: {earlier}" if earlier else "3-5 business days"
+
+    monkeypatch.setattr(router_service, "generate_reply", history_generate)
+    monkeypatch.setattr(router_service, "get_response_cache", lambda c=SemanticResponseCache(): c)
+
+    asyncio.run(router_service.handle_message(create_test_payload("jane@example.com 55501", 9020)))
+    follow_up = asyncio.run(router_service.handle_message(create_test_payload("How long does shipping take?", 9020)))
+    assert "55501" in follow_up.content
+    assert follow_up.debug_info["response_cache"] == "skip"
+
+    other = asyncio.run(router_service.handle_message(create_test_payload("How long does shipping take?", 9021)))
+    assert other.content == "3-5 business days"
+    assert other.debug_info["response_cache"] == "miss"
+
+
+def test_concurrent_conversations_overlap_on_generation(offline_kb, monkeypatch):
+    """Two conversations waiting on the LLM at once do not block each other."""
+    import time
+
+    async def slow_generate(**kwargs):
+        await asyncio.sleep(0.3)
+        return "ok"
+
+    monkeypatch.setattr(router_service, "generate_reply", slow_generate)
+    monkeypatch.setattr(router_service.settings, "RESPONSE_CACHE_ENABLED", False)
+
+    async def both():
+        return await asyncio.gather(
+            router_service.handle_message(create_test_payload("How do I take the chews?", 9101)),
+            router_service.handle_message(create_test_payload("Do you ship to Canada?", 9102)),
+        )
+
+    start = time.perf_counter()
+    replies = asyncio.run(both())
+    assert [r.content for r in replies] == ["ok", "ok"]
+    assert time.perf_counter() - start < 0.55
+
+
+def test_stream_message_yields_deltas_then_records_full_reply(offline_kb, monkeypatch):
+    """Streamed pieces arrive in order and the joined text lands in the history."""
+    from app.models.schemas import BotReply
+    from app.services.conversation_manager import get_conversation_manager
+
+    async def fake_stream(**kwargs):
+        for piece in ["Refunds ", "within ", "30 days."]:
+            yield piece
+
+    monkeypatch.setattr(router_service, "stream_reply", fake_stream)
+    monkeypatch.setattr(router_service.settings, "RESPONSE_CACHE_ENABLED", False)
+
+    async def collect():
+        return [item async for item in router_service.stream_message(
+            create_test_payload("Can I get a refund?", 9201)
+        )]
+
+    items = asyncio.run(collect())
+    assert items[:-1] == ["Refunds ", "within ", "30 days."]
+    assert isinstance(items[-1], BotReply)
+    assert items[-1].content == "Refunds within 30 days."
+
+    history = get_conversation_manager().create_or_get(9201, 1, None).messages
+    assert history[-1].content == "Refunds within 30 days."
+
+
+def test_identical_burst_makes_one_llm_call(offline_kb, monkeypatch):
+    """Concurrent identical questions share one retrieval and one generation."""
+    calls = []
+
+    async def slow_generate(**kwargs):
+        calls.append(kwargs["user_message"])
+        await asyncio.sleep(0.05)
+        return "shared answer"
+
+    monkeypatch.setattr(router_service, "generate_reply", slow_generate)
+    monkeypatch.setattr(router_service.settings, "RESPONSE_CACHE_ENABLED", False)
+
+    async def burst():
+        return await asyncio.gather(*(
+            router_service.handle_message(create_test_payload("Is it gluten free?", 9300))
+            for _ in range(5)
+        ))
+
+    replies = asyncio.run(burst())
+    assert {r.content for r in replies} == {"shared answer"}
+    assert len(calls) == 1
+    assert len(offline_kb.provider.calls) == 1
+
+
+def test_second_turn_sends_the_conversation_history(offline_kb, monkeypatch):
+    """Earlier turns of the conversation reach the prompt on the next message."""
+    from app.services.openai_service import build_messages
+
+    prompts = []
+
+    async def capturing_generate(**kwargs):
+        prompts.append(build_messages(
+            kwargs["user_message"], kwargs["context"], kwargs["extra_instructions"],
+            kwargs["retrieval"], kwargs["history"],
+        ))
+        return f"reply {len(prompts)}"
+
+    monkeypatch.setattr(router_service, "generate_reply", capturing_generate)
+    monkeypatch.setattr(router_service.settings, "RESPONSE_CACHE_ENABLED", False)
+
+    asyncio.run(router_service.handle_message(create_test_payload("Do you ship to Canada?", 9400)))
+    asyncio.run(router_service.handle_message(create_test_payload("How long does that take?", 9400)))
+
+    second = prompts[1]
+    assert [m["content"] for m in second[1:-1]] == ["Do you ship to Canada?", "reply 1"]
+    assert "How long does that take?" in second[-1]["content"]
+
+
+def test_open_circuit_answers_from_the_knowledge_base(offline_kb, monkeypatch):
+    """With the OpenAI circuit open the reply comes from the hybrid KB service."""
+    from app.services import openai_service
+    from app.services.circuit_breaker import OPEN
+
+    monkeypatch.setattr(router_service, "generate_reply", openai_service.generate_reply)
+    monkeypatch.setattr(openai_service.chat_breaker, "state", OPEN)
+    monkeypatch.setattr(openai_service.chat_breaker, "opened_at", float("inf"))
+
+    reply = asyncio.run(router_service.handle_message(create_test_payload("What is your refund policy?", 9500)))
+
+    assert reply.debug_info["llm_fallback"] == "CircuitOpenError"
+    assert reply.content
+
+
+def test_order_lookup_overlaps_kb_search(offline_kb, monkeypatch):
+    """An order-status turn takes about the longer of KB search and order lookup, not both."""
+    import time
+
+    from app.services.order_lookup import OrderLookup, OrderProvider
+
+    lookups = []
+
+    def slow_find(email, number):
+        lookups.append(email)
+        time.sleep(0.3)
+        return {"id": number}
+
+    understand = router_service._understand
+
+    def slow_understand(message):
+        time.sleep(0.3)
+        return understand(message)
+
+    async def fake_generate(**kwargs):
+        return "on its way"
+
+    lookup = OrderLookup([OrderProvider("shopify", "SHOPIFY", slow_find, lambda o: f"Order {o['id']}")])
+    monkeypatch.setattr(router_service, "get_order_lookup", lambda: lookup)
+    monkeypatch.setattr(router_service, "_understand", slow_understand)
+    monkeypatch.setattr(router_service, "generate_reply", fake_generate)
+
+    async def timed(message):
+        start = time.perf_counter()
+        reply = await router_service.handle_message(create_test_payload(message, 9600))
+        return time.perf_counter() - start, reply
+
+    elapsed, reply = asyncio.run(timed("Where is my order? dag@example.com 55501"))
+    assert elapsed < 0.55
+    assert reply.debug_info["order_lookups"]["shopify"]["outcome"] == "found"
+    assert reply.debug_info["stages"]["orders"]["start_ms"] < reply.debug_info["stages"]["understand"]["end_ms"]
+
+    # Not about an order: an email alone never reaches the order providers
+    elapsed, reply = asyncio.run(timed("Subscribe me to the newsletter, my email is bob@example.com"))
+    assert "orders" not in reply.debug_info["stages"]
+    assert lookups == ["dag@example.com"]
+
+    # Only the embedding says order status: the lookup runs after classification
+    monkeypatch.setattr(router_service, "classify_intent", lambda message, q_vec: ("order_status", 0.9, "embedding"))
+    elapsed, reply = asyncio.run(timed("Has my parcel left yet? eve@example.com 55502"))
+    assert lookups[-1] == "eve@example.com"
+    assert reply.debug_info["order_lookups"]["shopify"]["outcome"] == "found"
+
+
+def test_keyword_only_intent_does_not_filter_the_kb(tmp_path, monkeypatch):
+    """Without embeddings a misfiring keyword intent must not hide the right KB entry."""
+    from app.services.embedding_provider import EmbeddingProvider
+
+    class DownProvider(EmbeddingProvider):
+        model_name = "down"
+
+        def embed(self, texts):
+            raise ConnectionError("offline")
+
+    monkeypatch.setattr(kb_module.settings, "EMBEDDING_MAX_RETRIES", 0)
+    kb = kb_module.KBService(cache_dir=str(tmp_path), provider=DownProvider())
+    monkeypatch.setattr(kb_module, "_kb_service", kb)
+
+    (intent, _, source), retrieval = router_service._understand(
+        "What payment methods do you accept? Do you take PayPal?"
+    )
+    assert (intent, source) == ("usage", "keywords")
+    assert retrieval.filtered is False
+    assert retrieval.results[0][0].id == "faq_payment_methods"
+
+
+class FakeRetrieval:
+    def __init__(self, *scores, with_vector=True):
+        from app.models.schemas import KBItem
+
+        self.results = [
+            (KBItem(id=f"faq-{i}", type="faq", title="t", answer="a"), s) for i, s in enumerate(scores)
+        ]
+        self.query_vector = np.ones(3) if with_vector else None
+
+    def __bool__(self):
+        return bool(self.results)
+
+    @property
+    def top_score(self):
+        return self.results[0][1] if self.results else 0.0
+
+
+@pytest.mark.parametrize("intent, message, scores, with_vector, tier", [
+    ("general", "Hello there!", (), True, "kb_direct"),
+    ("general", "Hi, what is the price?", (0.5,), True, "full"),
+    ("refund", "What is your refund policy?", (0.91, 0.7), True, "kb_direct"),
+    ("refund", "What is your refund policy?", (0.91, 0.89), True, "small"),
+    ("shipping", "Do you ship to Canada?", (0.7,), True, "small"),
+    ("shipping", "Do you ship to Canada?", (0.95,), False, "full"),
+    ("safety", "Is it safe with my medication?", (0.95,), True, "full"),
+    ("general", "Tell me everything " * 20, (0.7,), True, "full"),
+])
+def test_route_message_tiers(intent, message, scores, with_vector, tier):
+    """Routing picks the cheapest tier the intent, KB score and length allow."""
+    chosen, reason = router_service.route_message(intent, message, FakeRetrieval(*scores, with_vector=with_vector))
+    assert chosen == tier, reason
+
+
+def test_greeting_is_answered_without_the_llm(offline_kb, monkeypatch):
+    async def failing_generate(**kwargs):
+        raise AssertionError("LLM should not be called")
+
+    monkeypatch.setattr(router_service, "generate_reply", failing_generate)
+
+    reply = asyncio.run(router_service.handle_message(create_test_payload("Hi!", 9600)))
+
+    assert reply.debug_info["route"]["tier"] == "kb_direct"
+    assert "help" in reply.content.lower()
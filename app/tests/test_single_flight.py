@@ -0,0 +1,76 @@
+# File: app/tests/test_single_flight.py
+
+import asyncio
+
+import pytest
+
+from app.services.single_flight import SingleFlight
+
+
+def test_concurrent_identical_keys_share_one_call():
+    """Ten concurrent callers with one key trigger a single upstream call."""
+    flight = SingleFlight()
+    calls = []
+
+    async def upstream():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    async def burst():
+        return await asyncio.gather(*(flight.do("q", upstream) for _ in range(10)))
+
+    assert asyncio.run(burst()) == ["answer"] * 10
+    assert len(calls) == 1
+    assert flight.stats()["coalesced"] == 9
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_different_keys_and_later_calls_are_not_coalesced():
+    flight = SingleFlight()
+    calls = []
+
+    async def upstream(key):
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        return key
+
+    async def run():
+        await asyncio.gather(flight.do("a", lambda: upstream("a")), flight.do("b", lambda: upstream("b")))
+        await flight.do("a", lambda: upstream("a"))
+
+    asyncio.run(run())
+    assert calls == ["a", "b", "a"]
+
+
+def test_errors_reach_every_waiter():
+    flight = SingleFlight()
+
+    async def failing():
+        await asyncio.sleep(0.01)
+        raise TimeoutError("upstream down")
+
+    async def burst():
+        return await asyncio.gather(*(flight.do("q", failing) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(burst())
+    assert all(isinstance(r, TimeoutError) for r in results)
+
+
+def test_cancelled_waiter_does_not_cancel_the_shared_call():
+    flight = SingleFlight()
+
+    async def upstream():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def run():
+        first = asyncio.ensure_future(flight.do("q", upstream))
+        second = asyncio.ensure_future(flight.do("q", upstream))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(run()) == "done"
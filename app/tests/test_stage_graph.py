@@ -0,0 +1,53 @@
+# File: app/tests/test_stage_graph.py
+
+import asyncio
+import time
+
+import pytest
+
+from app.services.stage_graph import StageGraph
+
+
+def test_independent_stages_overlap_and_dependants_get_results():
+    """Two 0.1 s stages run side by side; the join stage sees both results."""
+    async def slow(value):
+        await asyncio.sleep(0.1)
+        return value
+
+    async def join(a, b):
+        return a + b
+
+    graph = StageGraph()
+    graph.add("a", lambda: slow(1))
+    graph.add("b", lambda: slow(2))
+    graph.add("sum", join, deps=["a", "b"])
+
+    start = time.perf_counter()
+    results = asyncio.run(graph.run())
+
+    assert time.perf_counter() - start < 0.18
+    assert results == {"a": 1, "b": 2, "sum": 3}
+    assert graph.timings["sum"]["start_ms"] >= graph.timings["a"]["end_ms"]
+
+
+def test_failed_stage_cancels_the_rest():
+    """The first error is raised from run() and stages still running are cancelled."""
+    async def fail():
+        raise ValueError("shopify down")
+
+    async def forever():
+        await asyncio.sleep(10)
+
+    graph = StageGraph()
+    graph.add("slow", forever)
+    graph.add("broken", fail)
+
+    with pytest.raises(ValueError):
+        asyncio.run(graph.run())
+    assert graph.timings["slow"]["status"] == "cancelled"
+
+
+def test_stages_must_be_added_after_their_dependencies():
+    graph = StageGraph()
+    with pytest.raises(ValueError):
+        graph.add("generate", lambda: None, deps=["retrieve"])
@@ -0,0 +1,107 @@
+# File: app/tests/test_tracing.py
+
+import asyncio
+import logging
+
+from app.services import tracing
+from app.services.stage_graph import StageGraph
+
+
+def test_spans_nest_across_tasks_and_threads():
+    """Stage tasks and worker threads report into the request's trace under their parent span."""
+    def blocking_lookup():
+        with tracing.span("shopify") as attrs:
+            attrs["found"] = True
+        return tracing.outbound_headers()
+
+    async def handle():
+        graph = StageGraph("prepare")
+        graph.add("orders", lambda: asyncio.to_thread(blocking_lookup))
+        with tracing.start_trace("POST /api/test", "req-1") as trace:
+            with tracing.span("handle"):
+                results = await graph.run()
+        return trace, results
+
+    trace, results = asyncio.run(handle())
+    spans = {s["name"]: s for s in trace.summary()["spans"]}
+
+    assert results["orders"] == {"X-Request-ID": "req-1"}
+    assert spans["prepare.orders"]["parent"] == spans["handle"]["id"]
+    assert spans["shopify"]["parent"] == spans["prepare.orders"]["id"]
+    assert spans["shopify"]["attrs"] == {"found": True}
+    assert all(s["status"] == "ok" for s in spans.values())
+    assert trace.duration_ms >= spans["handle"]["duration_ms"]
+
+
+def test_trace_events_export_complete_events():
+    """Finished spans become Chrome "X" events; failed spans keep their status."""
+    with tracing.start_trace("POST /api/webhook/chatwoot") as trace:
+        try:
+            with tracing.span("chatwoot.send"):
+                raise ConnectionError("chatwoot down")
+        except ConnectionError:
+            pass
+
+    events = trace.trace_events()
+    complete = [e for e in events if e["ph"] == "X"]
+    assert [e["name"] for e in complete] == ["chatwoot.send"]
+    assert complete[0]["args"]["status"] == "error"
+    assert complete[0]["args"]["request_id"] == trace.request_id
+    assert any(e["ph"] == "M" for e in events)
+
+
+def test_without_a_trace_spans_are_no_ops_and_logs_show_a_dash(caplog):
+    """Outside a request spans record nothing and log lines carry "-" as request ID."""
+    import app.logger  # noqa: F401  installs the request ID on log records
+
+    with tracing.span("kb.search", passages=3) as attrs:
+        attrs["matches"] = 1
+    assert tracing.outbound_headers() == {}
+
+    with caplog.at_level(logging.INFO, logger="hardchews-bot"):
+        logging.getLogger("hardchews-bot").info("outside")
+        with tracing.start_trace("GET /api/x", "req-2"):
+            logging.getLogger("hardchews-bot").info("inside")
+    assert [r.request_id for r in caplog.records] == ["-", "req-2"]
+
+
+def test_streamed_response_is_traced_until_the_last_chunk():
+    """A streaming request's trace covers its body and is recorded only once it is sent."""
+    from types import SimpleNamespace
+
+    from app.main import trace_requests
+
+    async def call_next(request):
+        # Like Starlette: the app runs in its own task (inheriting the request
+        # trace) and feeds the body the middleware hands back
+        queue = asyncio.Queue()
+
+        async def app():
+            with tracing.span("generate", tier="small"):
+                await asyncio.sleep(0.2)
+                await queue.put(b"data: done\n\n")
+            await queue.put(None)
+
+        async def body():
+            while (chunk := await queue.get()) is not None:
+                yield chunk
+
+        asyncio.create_task(app())
+        return SimpleNamespace(headers={}, body_iterator=body())
+
+    request = SimpleNamespace(
+        method="POST", url=SimpleNamespace(path="/api/test/stream"), headers={"X-Request-ID": "req-stream"}
+    )
+
+    async def serve():
+        response = await trace_requests(request, call_next)
+        assert tracing.get_trace_recorder().get("req-stream") is None
+        return response, [chunk async for chunk in response.body_iterator]
+
+    response, chunks = asyncio.run(serve())
+    trace = tracing.get_trace_recorder().get("req-stream")
+
+    assert response.headers["X-Request-ID"] == "req-stream"
+    assert chunks == [b"data: done\n\n"]
+    assert trace.duration_ms >= 200
+    assert [s["name"] for s in trace.spans] == ["generate"]
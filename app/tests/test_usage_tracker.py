@@ -0,0 +1,61 @@
+# File: app/tests/test_usage_tracker.py
+
+import pytest
+
+from app.services.conversation_manager import ConversationManager
+from app.services.usage_tracker import UsageTracker, estimate_cost, usage_scope
+
+
+def test_cost_uses_per_model_prices():
+    assert estimate_cost("gpt-4o-mini", 1_000_000, 1_000_000) == pytest.approx(0.75)
+    assert estimate_cost("unknown-model", 1000, 1000) == 0.0
+
+
+def test_usage_is_aggregated_globally_per_intent_and_per_conversation(monkeypatch):
+    """One chat call shows up in the totals, its intent, its model and its conversation."""
+    manager = ConversationManager()
+    manager.create_or_get(42, 1)
+    monkeypatch.setattr(
+        "app.services.conversation_manager.get_conversation_manager", lambda *a, **k: manager
+    )
+
+    tracker = UsageTracker()
+    tracker.record("chat", "gpt-4o-mini", 1000, 200, latency=0.5, conversation_id=42, intent="refund")
+    tracker.record("chat", "gpt-4o-mini", latency=2.0, ok=False, conversation_id=42, intent="refund")
+    tracker.record("embedding", "text-embedding-3-small", 50, latency=0.1)
+
+    summary = tracker.summary()
+    assert summary["totals"]["calls"] == 3 and summary["totals"]["errors"] == 1
+    assert summary["by_intent"]["refund"]["prompt_tokens"] == 1000
+    assert summary["by_kind"]["chat"]["avg_latency_ms"] == pytest.approx(1250.0)
+    assert set(summary["by_model"]) == {"gpt-4o-mini", "text-embedding-3-small"}
+
+    conversation = manager.get_conversation_summary(42)["usage"]
+    assert conversation["calls"] == 2
+    assert conversation["completion_tokens"] == 200
+    assert conversation["cost_usd"] == pytest.approx(estimate_cost("gpt-4o-mini", 1000, 200))
+
+
+def test_calls_in_a_usage_scope_are_charged_once_the_intent_is_known(monkeypatch):
+    """An embedding made before classification lands in its conversation and intent."""
+    import asyncio
+
+    manager = ConversationManager()
+    manager.create_or_get(43, 1)
+    monkeypatch.setattr(
+        "app.services.conversation_manager.get_conversation_manager", lambda *a, **k: manager
+    )
+    tracker = UsageTracker()
+
+    async def turn():
+        with usage_scope(43) as usage:
+            await asyncio.to_thread(tracker.record, "embedding", "text-embedding-3-small", 40)
+        tracker.attribute(usage, "shipping")
+
+    asyncio.run(turn())
+    tracker.record("embedding", "text-embedding-3-small", 10)
+
+    summary = tracker.summary()
+    assert summary["totals"]["prompt_tokens"] == 50
+    assert summary["by_intent"]["shipping"]["prompt_tokens"] == 40
+    assert manager.get_conversation_summary(43)["usage"]["prompt_tokens"] == 40
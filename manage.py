@@ -22,7 +22,8 @@ def scrape_website():
 
 def test_kb():
     """Test knowledge base loading and embedding."""
-    from app.services.kb_service import kb_service
+    from app.services.kb_service import get_kb_service
+    kb_service = get_kb_service()
     print("📚 Testing Knowledge Base...")
     print(f"✅ Loaded {len(kb_service.items)} KB items")
     print(f"✅ Generated embeddings for {len(kb_service.embeddings)} items")
@@ -31,6 +32,103 @@ def test_kb():
     results = kb_service.search("What is HardChews?", top_k=3)
     print(f"✅ Search works! Found {len(results)} results for sample query")
 
+    kb_service.search("what is hardchews", top_k=3)
+    print(f"✅ Query embedding cache: {kb_service.query_cache.stats()}")
+
+
+def bench_kb(iterations: int = 200):
+    """Time KB search with the configured embedding backend (EMBEDDING_BACKEND=local runs offline)."""
+    import time
+    from app.services.kb_service import get_kb_service
+    kb_service = get_kb_service()
+
+    queries = [
+        "Where is my order?",
+        "How much does HardChews cost?",
+        "What is your refund policy?",
+        "How long does shipping take to Canada?",
+        "Are there any side effects?",
+    ]
+    print(f"⏱️  Benchmarking KB search ({kb_service.provider.model_name}, {len(kb_service.items)} items)")
+
+    start = time.perf_counter()
+    for q in queries:
+        kb_service.search(q, top_k=5)
+    cold_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    start = time.perf_counter()
+    for i in range(iterations):
+        kb_service.search(queries[i % len(queries)], top_k=5)
+    warm_ms = (time.perf_counter() - start) * 1000 / iterations
+
+    start = time.perf_counter()
+    for _ in range(iterations // len(queries)):
+        kb_service.search_many(queries, top_k=5)
+    batch_ms = (time.perf_counter() - start) * 1000 / max(iterations // len(queries) * len(queries), 1)
+
+    print(f"✅ first search per query: {cold_ms:.3f} ms")
+    print(f"✅ repeated search:        {warm_ms:.3f} ms")
+    print(f"✅ batched (search_many):  {batch_ms:.3f} ms per query")
+
+
+def reload_kb(base_url: str = "http://localhost:8000", force: bool = False):
+    """Ask a running server to hot-reload the knowledge base."""
+    import requests
+    from app.config import get_settings
+    settings = get_settings()
+
+    headers = {}
+    if settings.ADMIN_API_TOKEN:
+        headers["X-Admin-Token"] = settings.ADMIN_API_TOKEN
+
+    print(f"🔄 Reloading knowledge base on {base_url} ...")
+    resp = requests.post(
+        f"{base_url.rstrip('/')}/api/admin/kb/reload",
+        params={"force": str(force).lower()},
+        headers=headers,
+        timeout=300,
+    )
+    resp.raise_for_status()
+    result = resp.json()
+    if result["reloaded"]:
+        print(f"✅ KB reloaded: version {result['version']}, {result['items']} items, "
+              f"{result['embedded']} re-embedded, changed files: {', '.join(result['changed_files'])}")
+    else:
+        print(f"✅ KB already up to date (version {result['version']})")
+
+
+def show_usage(base_url: str = "http://localhost:8000"):
+    """Print OpenAI token, cost and latency totals from a running server."""
+    import requests
+    from app.config import get_settings
+    settings = get_settings()
+
+    headers = {}
+    if settings.ADMIN_API_TOKEN:
+        headers["X-Admin-Token"] = settings.ADMIN_API_TOKEN
+
+    resp = requests.get(f"{base_url.rstrip('/')}/api/admin/usage", headers=headers, timeout=30)
+    resp.raise_for_status()
+    usage = resp.json()
+
+    def row(name, t):
+        print(f"  {name:<24} {t['calls']:>7} {t['errors']:>6} {t['prompt_tokens']:>10} "
+              f"{t['completion_tokens']:>10} {t['avg_latency_ms']:>9.0f} {t['cost_usd']:>10.4f}")
+
+    print(f"\n{'='*50}")
+    print("📊 OpenAI usage")
+    print(f"{'='*50}")
+    print(f"  {'':<24} {'calls':>7} {'errors':>6} {'prompt':>10} {'completion':>10} {'avg ms':>9} {'cost $':>10}")
+    row("total", usage["totals"])
+    for section in ("by_kind", "by_model", "by_intent"):
+        if usage[section]:
+            print(f"\n  {section.replace('_', ' ')}:")
+            for name, totals in sorted(usage[section].items(), key=lambda kv: -kv[1]["cost_usd"]):
+                row(name, totals)
+    for kind, latency in usage["recent_latency"].items():
+        print(f"\n  {kind} latency (recent): p50 {latency['p50_ms']:.0f} ms, p95 {latency['p95_ms']:.0f} ms")
+    print(f"{'='*50}\n")
+
 
 def test_openai():
     """Test OpenAI connection."""
@@ -147,7 +245,10 @@ Available Commands:
   help              Show this help message
   health            Perform system health check
   test-kb           Test knowledge base loading
+  bench-kb          Benchmark KB search latency [iterations]
   test-openai       Test OpenAI API connection
+  reload-kb         Hot-reload the KB on a running server [url] [--force]
+  usage             Show OpenAI token/cost/latency totals of a running server [url]
   scrape-website    Scrape hardchews.shop for KB data
   cleanup-convs     Clean up old conversations
   load-samples      Show sample test conversations
@@ -175,10 +276,16 @@ def main():
         "help": help_command,
         "health": health_check,
         "test-kb": test_kb,
+        "bench-kb": lambda: bench_kb(int(sys.argv[2]) if len(sys.argv) > 2 else 200),
         "test-openai": test_openai,
         "scrape-website": scrape_website,
         "cleanup-convs": lambda: cleanup_conversations(int(sys.argv[2]) if len(sys.argv) > 2 else 1),
         "load-samples": load_sample_data,
+        "usage": lambda: show_usage(sys.argv[2] if len(sys.argv) > 2 else "http://localhost:8000"),
+        "reload-kb": lambda: reload_kb(
+            next((a for a in sys.argv[2:] if not a.startswith("--")), "http://localhost:8000"),
+            force="--force" in sys.argv[2:],
+        ),
     }
     
     if command in commands:
@@ -10,10 +10,13 @@ import os
 # Add app to path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from app.services.hybrid_response_service import hybrid_service
-from app.services.kb_service import kb_service
+from app.services.hybrid_response_service import get_hybrid_service
+from app.services.kb_service import get_kb_service
 from app.logger import logger
 
+hybrid_service = get_hybrid_service()
+kb_service = get_kb_service()
+
 def test_hybrid_responses():
     """বিভিন্ন intent এবং প্রশ্নে response টেস্ট করুন"""
     